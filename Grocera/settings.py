@@ -104,7 +104,9 @@ DATABASES = {
         'USER': config('user'),
         'PASSWORD': config('password'),
         'HOST': config('host'),
-        'PORT': config('port')
+        'PORT': config('port'),
+        # Bounds every lock wait, which ORDER_EVENT_SAFETY_LAG below relies on
+        'OPTIONS': {'options': f"-c lock_timeout={config('DB_LOCK_TIMEOUT', default='10s')}"},
     }
 }
 
@@ -174,16 +176,72 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.RoleAwareJWTAuthentication',
     ),
 }
 
 
+# Cache versions, cached responses, purchase sets and cache-backed carts are only correct when every
+# worker sees the same cache, so production sets REDIS_URL. The per-process LocMemCache fallback is for a
+# single local process; `manage.py check --deploy` warns about it (api.W001)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'grocera',
+        }
+    }
+
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+# Short enough that a missed invalidation can't leave has-ordered wrong for long
+PURCHASED_PRODUCTS_CACHE_TIMEOUT = 60 * 5
+
+# Seconds a cart holds the stock it reserved before the sweeper may release it
+STOCK_RESERVATION_TTL = 60 * 15
+
+# Balance snapshots are taken this many seconds in the past, which must exceed the longest
+# transaction that posts a ledger entry, so no entry commits behind a snapshot
+LEDGER_SNAPSHOT_LAG = 60
+
+# Most recent orders / wishlist items embedded by `/auth/users/me?expand=`
+PROFILE_EXPAND_LIMIT = 10
+
+# Seconds a stored Idempotency-Key response is replayed for retries
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+# Seconds a request holds its key; a retry after that takes it over, e.g. when the first worker died.
+# Must exceed the slowest idempotent request
+IDEMPOTENCY_KEY_LEASE = 60
+
+# Where live cart lines are kept. 'order.cart_backends.CacheCartBackend' keeps them in the cache
+# (which must then be shared between workers) and writes them to the DB at checkout and on `flush_carts`
+CART_BACKEND = config('CART_BACKEND', default='order.cart_backends.DatabaseCartBackend')
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Order event readers hold back events younger than this many seconds, which must comfortably exceed
+# the time between an event's INSERT and its commit (events are written after their locks are taken,
+# and DB_LOCK_TIMEOUT bounds any wait left), so an event whose transaction commits late is never skipped
+ORDER_EVENT_SAFETY_LAG = 30
+
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.TokenObtainPairSerializer',
 }
 
+# Embed the user's groups as a `roles` claim so permission checks skip auth_group.
+# Role changes take effect when the user next obtains a token.
+JWT_ROLES_CLAIM_ENABLED = True
+
 DJOSER = {
     'EMAIL_FRONTEND_PROTOCOL': config('FRONTEND_PROTOCOL'),
     'EMAIL_FRONTEND_DOMAIN': config('FRONTEND_DOMAIN'),
@@ -195,6 +253,14 @@ DJOSER = {
         'user_create': 'users.serializers.UserCreateSerializer',
         'current_user': 'users.serializers.UserSerializer'
     },
+    'EMAIL': {
+        'activation': 'users.emails.ActivationEmail',
+        'confirmation': 'users.emails.ConfirmationEmail',
+        'password_reset': 'users.emails.PasswordResetEmail',
+        'password_changed_confirmation': 'users.emails.PasswordChangedConfirmationEmail',
+        'username_changed_confirmation': 'users.emails.UsernameChangedConfirmationEmail',
+        'username_reset': 'users.emails.UsernameResetEmail',
+    },
 }
 
 SWAGGER_SETTINGS = {
@@ -215,6 +281,11 @@ EMAIL_PORT = config('EMAIL_PORT')
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
+# Outbox delivery (see send_queued_emails): retries back off as EMAIL_OUTBOX_BACKOFF * 2 ** (attempt - 1) seconds
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF = 60
+EMAIL_OUTBOX_LEASE = 60 * 5
+
 
 BACKEND_URL = config("BACKEND_URL")
 FRONTEND_URL = config("FRONTEND_URL")
\ No newline at end of file
@@ -0,0 +1,85 @@
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+ROLES_CLAIM = 'roles'
+
+
+class RoleAwareJWTAuthentication(JWTAuthentication):
+    """JWT authentication that seeds the request user's roles from the token's `roles` claim when present"""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        roles = validated_token.get(ROLES_CLAIM)
+        if roles is not None and getattr(settings, 'JWT_ROLES_CLAIM_ENABLED', True):
+            user._roles = frozenset(roles)
+        return user
+
+
+class LazyTokenUser:
+    """
+    Request user built from JWT claims. id, email, roles and is_staff come straight from the token;
+    any other attribute loads the real User row once, on first access. Filter querysets with
+    `user_id=request.user.pk` rather than `user=request.user`, which needs a model instance.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        # simplejwt writes the claim as a string; compare and filter with the model's own type
+        self.id = self.pk = get_user_model()._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+        self.email = token.get('email')
+        self.is_staff = token.get('is_staff', False)
+        self._roles = frozenset(token.get(ROLES_CLAIM, ()))
+        self._user = None
+
+    def get_user(self):
+        if self._user is None:
+            self._user = get_user_model().objects.get(**{api_settings.USER_ID_FIELD: self.pk})
+            self._user._roles = self._roles
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __eq__(self, other):
+        if isinstance(other, (LazyTokenUser, get_user_model())):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.email or str(self.pk)
+
+
+class StatelessJWTAuthentication(RoleAwareJWTAuthentication):
+    """
+    For safe methods, authenticates from the token alone and returns a LazyTokenUser, so the
+    request runs without loading the User row. Unsafe methods, and tokens issued before the
+    email/roles claims existed, fall back to the regular database-backed user.
+    Deactivating a user takes effect for reads when their access token expires.
+    """
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if ROLES_CLAIM not in validated_token or 'email' not in validated_token:
+            return self.get_user(validated_token), validated_token
+        return LazyTokenUser(validated_token), validated_token
@@ -0,0 +1,146 @@
+import time
+import hashlib
+import logging
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.utils.http import http_date
+from rest_framework.response import Response
+from django.utils.cache import get_conditional_response
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'version:{scope}'
+STATS_KEY = 'response-cache:stats:{outcome}'
+
+
+def get_versions(scopes):
+    """
+    Current version of each scope. A version is the time.time_ns() of the scope's last change,
+    so a counter that was evicted and re-seeded can never repeat an older value.
+    """
+    keys = {VERSION_KEY.format(scope=scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    versions = {scope: found.get(key) for key, scope in keys.items()}
+    missing = {key: time.time_ns() for key, scope in keys.items() if versions[scope] is None}
+    for key, version in missing.items():
+        cache.add(key, version, timeout=None)
+        versions[keys[key]] = cache.get(key, version)
+    return versions
+
+
+def bump_versions(*scopes):
+    """
+    Runs when the surrounding transaction commits (at once outside one). Bumping earlier would let a
+    reader cache rows from before the commit under the new version, where they'd stay until expiry.
+    """
+    if scopes:
+        transaction.on_commit(lambda: cache.set_many(
+            {VERSION_KEY.format(scope=scope): time.time_ns() for scope in scopes}, timeout=None))
+
+
+def invalidate_catalog(product_ids=(), category_ids=()):
+    """Invalidate cached catalog reads touching the given products and categories"""
+    scopes = ['catalog']
+    scopes += [f'product:{product_id}' for product_id in set(product_ids)]
+    scopes += [f'category:{category_id}' for category_id in set(category_ids) if category_id is not None]
+    bump_versions(*scopes)
+
+
+def record_cache_outcome(outcome):
+    key = STATS_KEY.format(outcome=outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+    logger.debug("response cache %s", outcome)
+
+
+def get_cache_stats():
+    stats = cache.get_many([STATS_KEY.format(outcome=outcome) for outcome in ('hit', 'miss')])
+    hits = stats.get(STATS_KEY.format(outcome='hit'), 0)
+    misses = stats.get(STATS_KEY.format(outcome='miss'), 0)
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / (hits + misses) if hits + misses else 0}
+
+
+def normalized_query(request):
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key) if value != '')
+    return urlencode(params)
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for anonymous list/retrieve responses. Keys combine the view, lookup,
+    normalized query params and the versions of `get_cache_scopes()`, so bumping a scope's
+    version invalidates every response built from it without having to find those keys.
+    """
+    cache_timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        versions = get_versions(self.get_cache_scopes())
+        token = ':'.join(f'{scope}={version}' for scope, version in sorted(versions.items()))
+        lookup = ':'.join(f'{key}={value}' for key, value in sorted(self.kwargs.items()))
+        digest = hashlib.sha1(f'{lookup}|{normalized_query(request)}|{token}'.encode()).hexdigest()
+        return f'response:{self.basename}:{self.action}:{digest}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            record_cache_outcome('hit')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        record_cache_outcome('miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+def conditional_get(view_method):
+    """
+    ETag / Last-Modified validators for a list or retrieve handler, computed from the versions of
+    `self.get_cache_scopes()` without touching the serializer. Matching If-None-Match or
+    If-Modified-Since requests get a 304 before the handler runs.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        scopes = self.get_cache_scopes()
+        if scopes is None:
+            return view_method(self, request, *args, **kwargs)
+
+        versions = get_versions(scopes)
+        user_id = request.user.pk if request.user.is_authenticated else None
+        lookup = ':'.join(f'{key}={value}' for key, value in sorted(kwargs.items()))
+        token = ':'.join(f'{scope}={version}' for scope, version in sorted(versions.items()))
+        etag = '"%s"' % hashlib.sha1(
+            f'{self.basename}|{self.action}|{lookup}|{normalized_query(request)}|{user_id}|{token}'.encode()).hexdigest()
+        last_modified = max(versions.values(), default=0) // 10 ** 9
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+    return wrapper
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Warning, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Cache-version invalidation only reaches other workers through a shared cache"""
+    if settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    return [Warning(
+        "The default cache is a per-process LocMemCache, so invalidations made by one worker are invisible "
+        "to the others: cached catalog responses, ETags and has-ordered sets go stale between workers.",
+        hint="Set REDIS_URL so every worker shares one cache.",
+        id='api.W001',
+    )]
@@ -0,0 +1,129 @@
+import json
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from api.models import IdempotencyKey
+from django.utils import timezone
+from django.http import HttpResponseRedirect
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from django.db import IntegrityError, transaction
+
+
+HEADER = 'Idempotency-Key'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str) if hasattr(request.data, 'keys') else str(request.data)
+    return hashlib.sha256(f'{request.method}|{request.path}|{body}'.encode()).hexdigest()
+
+
+def replay(record):
+    response = HttpResponseRedirect(record.response_location) if record.response_location \
+        else Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(scope, key, fingerprint):
+    """
+    Return (existing unexpired row, None), or take the key and return (None, lease). The lease is the row's
+    `locked_until`: a request whose worker died stops holding the key once it passes, and the caller only
+    writes its outcome while the row still carries its lease.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+    lease = now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_LEASE', 60))
+    for _ in range(2):
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is not None:
+            if record.expires_at <= now:
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            elif record.status_code is None and record.request_hash == fingerprint \
+                    and (record.locked_until is None or record.locked_until <= now):
+                if IdempotencyKey.objects.filter(pk=record.pk, status_code=None, locked_until=record.locked_until).update(
+                        locked_until=lease, expires_at=expires_at):
+                    return None, lease
+                continue
+            else:
+                return record, None
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(scope=scope, key=key, request_hash=fingerprint,
+                                              expires_at=expires_at, locked_until=lease)
+            return None, lease
+        except IntegrityError:
+            # Lost the race to a concurrent first request; read its row
+            continue
+    return IdempotencyKey.objects.filter(scope=scope, key=key).first(), None
+
+
+def idempotent(scope, key_func=None):
+    """
+    Run a view at most once per key. The key is the `Idempotency-Key` header (scoped to the user) or, for
+    server-to-server callbacks, `key_func(request)`. Retries get the stored response without running the
+    view again; a retry while the first request is still running gets 409, until IDEMPOTENCY_KEY_LEASE
+    runs out. The view runs in one transaction with the stored outcome; responses with status 500 or
+    above roll it back and aren't stored, so those can be retried. Requests without a key run normally.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            if key_func is not None:
+                key, full_scope = key_func(request), scope
+            else:
+                key = request.headers.get(HEADER)
+                user_id = request.user.pk if request.user.is_authenticated else None
+                full_scope = f'{scope}:{user_id}'
+            if not key:
+                return view(*args, **kwargs)
+
+            fingerprint = request_fingerprint(request) if key_func is None else ''
+            record, lease = claim(full_scope, key[:255], fingerprint)
+            if record is not None:
+                if record.request_hash != fingerprint:
+                    return Response({'detail': f"{HEADER} was already used for a different request"},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if record.status_code is None:
+                    return Response({'detail': "A request with this key is still being processed"},
+                                    status=status.HTTP_409_CONFLICT)
+                return replay(record)
+
+            held = IdempotencyKey.objects.filter(scope=full_scope, key=key[:255], locked_until=lease)
+            try:
+                # The outcome commits with the view's own writes, and the key row stays locked until then,
+                # so a retry taking over an expired lease can only ever find a run that left no effects
+                with transaction.atomic():
+                    if not list(held.select_for_update().values_list('pk', flat=True)):
+                        return Response({'detail': "A request with this key is still being processed"},
+                                        status=status.HTTP_409_CONFLICT)
+                    response = view(*args, **kwargs)
+                    if response.status_code >= 500:
+                        transaction.set_rollback(True)
+                    else:
+                        held.update(
+                            status_code=response.status_code,
+                            response_body=getattr(response, 'data', None),
+                            response_location=response.get('Location', '') if isinstance(response, HttpResponseRedirect) else '')
+            except Exception:
+                held.delete()
+                raise
+            if response.status_code >= 500:
+                held.delete()
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys(batch_size=5000):
+    """Delete expired keys in batches so the table stays small. Returns the number deleted"""
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
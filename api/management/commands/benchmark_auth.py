@@ -0,0 +1,50 @@
+from django.db import connection
+from django.urls import resolve
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import CaptureQueriesContext
+from users.serializers import TokenObtainPairSerializer
+from api.authentication import RoleAwareJWTAuthentication
+
+
+class Command(BaseCommand):
+    help = "Compare queries per request for read endpoints under stateless vs database-backed JWT authentication"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help="User to authenticate as")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Endpoint to measure (repeatable). Defaults to cart, wishlist and products")
+        parser.add_argument('--host', default='127.0.0.1', help="Host header, must be in ALLOWED_HOSTS")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+
+        token = TokenObtainPairSerializer.get_token(user).access_token
+        client = APIClient(HTTP_HOST=options['host'])
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        paths = options['paths'] or ['/api/v1/cart/', '/api/v1/Wishlist/', '/api/v1/products/']
+
+        self.stdout.write(f"{'endpoint':40} {'db auth':>8} {'stateless':>10} {'saved':>6}")
+        for path in paths:
+            view_class = resolve(path).func.cls
+            stateless = self.count_queries(client, path)
+            original = view_class.authentication_classes
+            view_class.authentication_classes = [RoleAwareJWTAuthentication]
+            try:
+                database_backed = self.count_queries(client, path)
+            finally:
+                view_class.authentication_classes = original
+            self.stdout.write(f"{path:40} {database_backed:>8} {stateless:>10} {database_backed - stateless:>6}")
+
+    def count_queries(self, client, path):
+        # Warm-up request so lazily created rows (e.g. the cart) don't skew the comparison
+        client.get(path)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path)
+        if response.status_code >= 400:
+            raise CommandError(f"GET {path} returned {response.status_code}")
+        return len(context.captured_queries)
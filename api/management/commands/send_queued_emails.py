@@ -0,0 +1,26 @@
+import time
+from api.outbox import send_batch
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Send due emails from the outbox in batches. Drains the queue once, or keeps polling with --loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the queue is empty")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            result = send_batch(batch_size=options['batch_size'])
+            if result is not None:
+                sent, failed = result
+                total_sent += sent
+                total_failed += failed
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {total_sent} emails, {total_failed} failed attempts"))
@@ -1,3 +1,65 @@
 from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
 
-# Create your models here.
+
+class IdempotencyKey(models.Model):
+    """
+    One row per (scope, key). `status_code` stays null while the first request is still running;
+    once it finishes, its response is stored and replayed for retries until `expires_at`. A running
+    request holds the key until `locked_until`, after which a retry may take it over.
+    """
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=JSONEncoder)
+    response_location = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    locked_until = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent by `send_queued_emails`. Rows with a `kind` are rendered by the renderer
+    registered for it from `payload`; rows without one carry their rendered subject and body.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    to = models.EmailField()
+    kind = models.CharField(max_length=50, blank=True)
+    payload = models.JSONField(default=dict, encoder=JSONEncoder)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind or self.subject} to {self.to} ({self.status})"
@@ -0,0 +1,119 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api.models import OutboxEmail
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+
+logger = logging.getLogger(__name__)
+
+renderers = {}
+
+
+def register_renderer(kind):
+    """
+    Register `fn(emails) -> {email.pk: (subject, body)}` for outbox rows of `kind`.
+    It gets a whole batch at once, so it can load what it needs with a constant number of queries.
+    """
+    def decorator(fn):
+        renderers[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue(to, subject='', body='', html_body='', kind='', payload=None):
+    """Queue an email; call inside the transaction that produced it so both commit or neither does"""
+    return OutboxEmail.objects.create(to=to, subject=subject, body=body, html_body=html_body,
+                                      kind=kind, payload=payload or {})
+
+
+def claim_batch(batch_size):
+    """Lock due rows, push their next attempt past the lease so no other worker picks them up, and return them"""
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE', 60 * 5))
+    with transaction.atomic():
+        emails = list(OutboxEmail.objects.select_for_update(skip_locked=True)
+                      .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+                      .order_by('next_attempt_at', 'id')[:batch_size])
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(next_attempt_at=now + lease)
+    return emails
+
+
+def render(emails):
+    by_kind = {}
+    for email in emails:
+        if email.kind:
+            by_kind.setdefault(email.kind, []).append(email)
+    for kind, batch in by_kind.items():
+        # Rows left unrendered fail in send_batch and are retried like any other failure
+        try:
+            rendered = renderers[kind](batch)
+        except Exception:
+            logger.exception("outbox renderer for %s failed", kind)
+            continue
+        for email in batch:
+            if email.pk in rendered:
+                email.subject, email.body = rendered[email.pk]
+
+
+def record_failure(email, error):
+    """Count a failed attempt and push the next one out with exponential backoff, or give up after the last"""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5):
+        email.status = OutboxEmail.FAILED
+    email.next_attempt_at = timezone.now() + timedelta(
+        seconds=getattr(settings, 'EMAIL_OUTBOX_BACKOFF', 60) * 2 ** (email.attempts - 1))
+
+
+def send_batch(batch_size=100):
+    """
+    Send one batch of due emails over a single backend connection. Failures are retried with exponential
+    backoff until EMAIL_OUTBOX_MAX_ATTEMPTS. Returns (sent, failed) counts, or None if nothing was due.
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return None
+
+    fields = ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    try:
+        render(emails)
+        connection = get_connection()
+        connection.open()
+    except Exception as e:
+        # e.g. the SMTP server is down: the whole batch counts as an attempt, so it backs off and can give up
+        logger.warning("outbox batch of %s emails failed before sending: %s", len(emails), e)
+        for email in emails:
+            record_failure(email, e)
+        OutboxEmail.objects.bulk_update(emails, fields)
+        return 0, len(emails)
+
+    sent = failed = 0
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(email.subject, email.body, settings.EMAIL_HOST_USER, [email.to],
+                                             connection=connection)
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            try:
+                if not email.subject and not email.body:
+                    raise ValueError(f"Nothing rendered for {email.kind or 'email'} {email.pk}")
+                message.send()
+            except Exception as e:
+                record_failure(email, e)
+                logger.warning("outbox email %s failed (attempt %s): %s", email.pk, email.attempts, e)
+                failed += 1
+            else:
+                email.attempts += 1
+                email.status = OutboxEmail.SENT
+                email.sent_at = timezone.now()
+                sent += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.warning("closing the outbox email connection failed", exc_info=True)
+        OutboxEmail.objects.bulk_update(emails, fields)
+    return sent, failed
@@ -1,3 +1,4 @@
+from api.roles import is_seller
 from rest_framework import permissions
 
 
@@ -10,8 +11,9 @@ class IsAdminOrReadOnly(permissions.BasePermission):
 
 class IsSellerOrAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
-        if request.method == 'POST':
-            return request.user and request.user.is_authenticated and (request.user.is_staff or request.user.groups.filter(name='seller').exists())
+        # Collection-level writes (create, bulk actions) have no object to check ownership against
+        if request.method == 'POST' or (request.method not in permissions.SAFE_METHODS and getattr(view, 'detail', True) is False):
+            return request.user and request.user.is_authenticated and (request.user.is_staff or is_seller(request.user))
         return True
 
     def has_object_permission(self, request, view, obj):
@@ -22,12 +24,17 @@ class IsSellerOrAdmin(permissions.BasePermission):
         return getattr(obj, 'seller', None) == request.user
 
 
+class IsSellerOrStaff(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and (request.user.is_staff or is_seller(request.user)))
+
+
 class IsSeller(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return True
 
         if request.method == 'POST':
-            return (request.user.is_authenticated and request.user.groups.filter(name='seller').exists())
+            return (request.user.is_authenticated and is_seller(request.user))
         return False
 
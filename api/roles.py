@@ -0,0 +1,16 @@
+SELLER = 'seller'
+
+
+def get_roles(user):
+    """Group names of `user`, resolved once and cached on the user object for the rest of the request"""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        user._roles = roles
+    return roles
+
+
+def is_seller(user):
+    return SELLER in get_roles(user)
@@ -1,3 +1,270 @@
-from django.test import TestCase
+from io import StringIO
+from types import SimpleNamespace
+from datetime import timedelta
+from unittest import mock
+from django.db import connection
+from django.utils import timezone
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from api.authentication import LazyTokenUser
+from api.roles import get_roles, is_seller
+from api.models import IdempotencyKey, OutboxEmail
+from api.idempotency import purge_expired_keys, request_fingerprint
+from api.outbox import enqueue, send_batch
+from product.models import Category, Product
+from product.tests import make_seller, make_products
+from order.models import Order
+from order.tests import ShopperTestCase
+from users.models import Deposit, LedgerEntry
 
-# Create your tests here.
+User = get_user_model()
+
+
+def obtain_token(email, password='x'):
+    response = APIClient().post('/api/v1/auth/jwt/create/', {'email': email, 'password': password})
+    return response.json()
+
+
+def queried_tables(queries):
+    return ' '.join(query['sql'] for query in queries)
+
+
+class RoleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.category = Category.objects.create(name='Fruit')
+
+    def test_roles_are_resolved_once(self):
+        seller = User.objects.get(pk=self.seller.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_seller(seller))
+            self.assertEqual(get_roles(seller), {'seller'})
+        self.assertEqual(get_roles(None), frozenset())
+
+    def test_token_carries_the_roles_claim(self):
+        tokens = obtain_token(self.seller.email)
+        self.assertEqual(AccessToken(tokens['access'])['roles'], ['seller'])
+        refreshed = APIClient().post('/api/v1/auth/jwt/refresh/', {'refresh': tokens['refresh']}).json()
+        self.assertEqual(AccessToken(refreshed['access'])['roles'], ['seller'])
+
+    def test_seller_check_skips_auth_group(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + obtain_token(self.seller.email)['access'])
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/v1/products/', {'name': 'apple', 'description': 'red', 'price': 1,
+                                                         'stock': 5, 'category': self.category.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('auth_group', queried_tables(queries))
+
+    @override_settings(JWT_ROLES_CLAIM_ENABLED=False)
+    def test_without_the_claim_roles_come_from_the_database(self):
+        access = obtain_token(self.seller.email)['access']
+        self.assertNotIn('roles', AccessToken(access))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + access)
+        response = client.post('/api/v1/products/', {'name': 'apple', 'description': 'red', 'price': 1,
+                                                     'stock': 5, 'category': self.category.pk})
+        self.assertEqual(response.status_code, 201)
+
+    def test_buyer_can_not_create_products(self):
+        User.objects.create_user(email='buyer@example.com', password='x')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + obtain_token('buyer@example.com')['access'])
+        response = client.post('/api/v1/products/', {'name': 'apple', 'description': 'red', 'price': 1,
+                                                     'stock': 5, 'category': self.category.pk})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Product.objects.exists())
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.product = make_products(self.seller, Category.objects.create(name='Fruit'), count=1)[0]
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='JWT ' + obtain_token(self.buyer.email)['access'])
+
+    def test_reads_do_not_load_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/Wishlist/ids/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(User._meta.db_table, queried_tables(queries))
+        self.assertEqual(len(queries), 1)
+
+    def test_writes_load_the_user(self):
+        self.buyer.is_active = False
+        self.buyer.save()
+        self.assertEqual(self.client.get('/api/v1/Wishlist/ids/').status_code, 200)
+        response = self.client.post('/api/v1/Wishlist/bulk/', {'product_ids': [self.product.pk]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + str(RefreshToken.for_user(self.buyer).access_token))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/v1/Wishlist/ids/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(User._meta.db_table, queried_tables(queries))
+
+    def test_lazy_user_loads_the_row_on_first_other_attribute(self):
+        user = LazyTokenUser(AccessToken(obtain_token(self.seller.email)['access']))
+        with self.assertNumQueries(0):
+            self.assertEqual((user.pk, user.email), (self.seller.pk, self.seller.email))
+            self.assertTrue(is_seller(user))
+            self.assertEqual(user, self.seller)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, 'Sel')
+            self.assertEqual(user.last_name, 'Ler')
+
+
+class IdempotencyTests(ShopperTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add(self.product, 2)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.checkout(**{'Idempotency-Key': 'k1'})
+        self.assertEqual(first.status_code, 201)
+        retry = self.checkout(**{'Idempotency-Key': 'k1'})
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reusing_a_key_for_another_body_is_422(self):
+        self.checkout(**{'Idempotency-Key': 'k1'})
+        response = self.client.post('/api/v1/orders/', {'cart_id': str(self.other.pk)}, format='json',
+                                    headers={'Idempotency-Key': 'k1'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.checkout(**{'Idempotency-Key': 'k1'})
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(email='other@example.com', password='x'))
+        response = other.post('/api/v1/orders/', {'cart_id': self.cart_id}, format='json',
+                              headers={'Idempotency-Key': 'k1'})
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def held_key(self, locked_until):
+        request = SimpleNamespace(method='POST', path='/api/v1/orders/', data={'cart_id': self.cart_id})
+        return IdempotencyKey.objects.create(
+            scope=f'orders.create:{self.buyer.pk}', key='k1', request_hash=request_fingerprint(request),
+            expires_at=timezone.now() + timedelta(hours=1), locked_until=locked_until)
+
+    def test_retry_during_the_lease_is_409(self):
+        self.held_key(timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.checkout(**{'Idempotency-Key': 'k1'}).status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_retry_takes_over_an_expired_lease(self):
+        self.held_key(timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.checkout(**{'Idempotency-Key': 'k1'}).status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+    def test_crash_rolls_back_and_frees_the_key(self):
+        with mock.patch('order.services.queue_order_confirmation', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.checkout(**{'Idempotency-Key': 'k1'})
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 10)
+        self.assertEqual(self.checkout(**{'Idempotency-Key': 'k1'}).status_code, 201)
+
+    def test_purge_expired_keys(self):
+        self.checkout(**{'Idempotency-Key': 'k1'})
+        self.assertEqual(purge_expired_keys(), 0)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(purge_expired_keys(), 1)
+
+
+class PaymentCallbackTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.deposit = Deposit.objects.create(user=self.user, amount=50)
+
+    def success(self, tran_id):
+        return APIClient().post('/api/v1/payment/success/', {'tran_id': tran_id})
+
+    def test_repeated_callbacks_credit_once(self):
+        for _ in range(2):
+            self.assertEqual(self.success(f'x_{self.deposit.pk}').status_code, 302)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 50)
+        self.assertEqual(LedgerEntry.objects.filter(deposit=self.deposit).count(), 1)
+        self.deposit.refresh_from_db()
+        self.assertEqual(self.deposit.status, 'completed')
+
+    def test_bad_tran_ids_are_client_errors(self):
+        self.assertEqual(self.success('garbage').status_code, 400)
+        self.assertEqual(self.success('x_abc').status_code, 400)
+        self.assertEqual(self.success('x_999').status_code, 404)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 0)
+
+
+@override_settings(EMAIL_OUTBOX_BACKOFF=60, EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class OutboxTests(TestCase):
+    def due(self):
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+
+    def test_sends_due_emails_in_one_batch(self):
+        for index in range(3):
+            enqueue(to=f'user{index}@example.com', subject='Hello', body='Hi')
+        self.assertEqual(send_batch(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {(OutboxEmail.SENT, 1)})
+        self.assertIsNone(send_batch())
+
+    def test_failures_back_off_then_give_up(self):
+        email = enqueue(to='user@example.com', subject='Hello', body='Hi')
+        with mock.patch('api.outbox.EmailMultiAlternatives.send', side_effect=OSError('refused')):
+            for attempt, delay in enumerate([60, 120], start=1):
+                before = timezone.now()
+                self.assertEqual(send_batch(), (0, 1))
+                email.refresh_from_db()
+                self.assertEqual((email.status, email.attempts, email.last_error), (OutboxEmail.PENDING, attempt, 'refused'))
+                self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=delay))
+                # Not due again until the backoff passes
+                self.assertIsNone(send_batch())
+                self.due()
+            send_batch()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.FAILED, 3))
+        self.due()
+        self.assertIsNone(send_batch())
+
+    def test_unreachable_server_counts_an_attempt_for_the_batch(self):
+        for index in range(2):
+            enqueue(to=f'user{index}@example.com', subject='Hello', body='Hi')
+        with mock.patch('api.outbox.get_connection') as get_connection:
+            get_connection.return_value.open.side_effect = ConnectionRefusedError('smtp down')
+            self.assertEqual(send_batch(), (0, 2))
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {(OutboxEmail.PENDING, 1)})
+        self.due()
+        self.assertEqual(send_batch(), (2, 0))
+
+    def test_kind_rows_are_rendered_from_their_payload(self):
+        seller = make_seller()
+        product = make_products(seller, Category.objects.create(name='Fruit'), count=1)[0]
+        order = Order.objects.create(user=seller, total_price=4)
+        seller_order = order.seller_orders.create(seller=seller, total_price=4, item_count=2)
+        order.items.create(product=product, seller=seller, seller_order=seller_order, price=2, quantity=2, total_price=4)
+        enqueue(to=seller.email, kind='order_confirmation', payload={'order_id': str(order.pk)})
+        enqueue(to=seller.email, kind='order_confirmation', payload={'order_id': '00000000-0000-0000-0000-000000000000'})
+        self.assertEqual(send_batch(), (1, 1))
+        self.assertIn('banana 0', mail.outbox[0].body)
+        self.assertIn('Nothing rendered', OutboxEmail.objects.get(status=OutboxEmail.PENDING).last_error)
+
+    def test_command_drains_the_queue(self):
+        for index in range(5):
+            enqueue(to=f'user{index}@example.com', subject='Hello', body='Hi')
+        out = StringIO()
+        call_command('send_queued_emails', batch_size=2, stdout=out)
+        self.assertIn('Sent 5 emails', out.getvalue())
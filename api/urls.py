@@ -1,7 +1,7 @@
 from django.urls import path,include
 from rest_framework_nested import routers
 from product.views import ProductViewSet, ProductImageViewSet, CategoryViewSet, ReviewViewSet
-from order.views import WishlistViewSet, CartViewSet, CartItemViewSet, OrderViewset, HasOrderedProduct
+from order.views import WishlistViewSet, CartViewSet, CartItemViewSet, OrderViewset, SellerOrderViewSet, HasOrderedProduct, OrderEventFeed
 from users.views import DepositViewSet, DashboardView, initiate_payment, payment_success, payment_cancel, payment_fail
 
 
@@ -11,6 +11,7 @@ router.register('categories', CategoryViewSet)
 router.register('Wishlist', WishlistViewSet, basename='wishlist')
 router.register('cart', CartViewSet, basename='cart')
 router.register('orders', OrderViewset, basename='orders')
+router.register('seller-orders', SellerOrderViewSet, basename='seller-orders')
 router.register('deposits', DepositViewSet, basename='deposit')
 
 product_router = routers.NestedDefaultRouter(router, 'products', lookup='product')
@@ -34,6 +35,7 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
     path('orders/has-ordered/<int:product_id>/', HasOrderedProduct.as_view()),
+    path('order-events/', OrderEventFeed.as_view(), name='order-events'),
     path("payment/initiate/", initiate_payment, name="initiate-payment"),
     path("payment/success/", payment_success, name="payment-success"),
     path("payment/fail/", payment_fail, name="payment-fail"),
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'order'
+
+    def ready(self):
+        import order.signals  # noqa: F401
+        import order.emails  # noqa: F401
@@ -0,0 +1,255 @@
+import time
+from decimal import Decimal
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from product.models import Product
+from api.caching import bump_versions
+from order.models import Cart, CartItem
+from rest_framework.exceptions import ValidationError
+from order.services import CartService, ReservationService
+
+
+def attach_items(cart, items):
+    """Hand `items` to `cart.items.all()` the way prefetch_related does, so CartSerializer can't tell the difference"""
+    queryset = cart.items.all()
+    queryset._result_cache = items
+    queryset._prefetch_done = True
+    cart._prefetched_objects_cache = {'items': queryset}
+    return cart
+
+
+class DatabaseCartBackend:
+    """Cart lines are `order_cartitem` rows; every edit writes them and refreshes the cart's totals"""
+
+    def get_cart(self, user_id):
+        items = CartItem.objects.select_related('product').prefetch_related('product__images').order_by('id')
+        cart = Cart.objects.prefetch_related(Prefetch('items', queryset=items)).filter(user_id=user_id).first()
+        if cart is None:
+            cart, created = Cart.objects.get_or_create(user_id=user_id)
+        return cart
+
+    def cache_scopes(self, user_id):
+        rows = list(Cart.objects.filter(user_id=user_id).values_list('id', 'items__product_id'))
+        if not rows:
+            return None
+        return [f'cart:{rows[0][0]}'] + [f'product:{product_id}' for _, product_id in rows if product_id is not None]
+
+    def summary(self, user_id):
+        return Cart.objects.filter(user_id=user_id).values('id', 'item_count', 'subtotal').first()
+
+    def has_items(self, cart_id):
+        return CartItem.objects.filter(cart_id=cart_id).exists()
+
+    def lines(self, cart_id, product_ids=None):
+        items = CartItem.objects.filter(cart_id=cart_id)
+        if product_ids is not None:
+            items = items.filter(product_id__in=product_ids)
+        return list(items.select_related('product').prefetch_related('product__images').order_by('id'))
+
+    def get_line(self, cart_id, item_id):
+        return CartItem.objects.select_related('product').filter(cart_id=cart_id, pk=item_id).first()
+
+    def add_items(self, cart_id, quantities):
+        CartService.add_items(cart_id, quantities)
+
+    def set_quantity(self, line, quantity):
+        with transaction.atomic():
+            ReservationService.adjust(line.cart_id, line.product_id, quantity)
+            line.quantity = quantity
+            line.save()
+            CartService.refresh_totals([line.cart_id])
+
+    def remove(self, line):
+        with transaction.atomic():
+            ReservationService.release(line.cart_id, line.product_id)
+            line.delete()
+            CartService.refresh_totals([line.cart_id])
+
+    def dirty_carts(self):
+        return []
+
+    def flush(self, cart_id):
+        pass
+
+    @contextmanager
+    def checkout(self, cart_id):
+        yield
+
+
+class CacheCartBackend:
+    """
+    The live cart is a `{product_id: quantity}` dict in the cache, so edits don't touch `order_cartitem`
+    (stock reservations are still written). A line's id is its product id. `flush` writes the dict
+    through to `order_cartitem` at checkout and from `flush_carts`; a cart evicted from the cache is
+    reloaded from its last flush. Each edited cart gets its own dirty marker, found by scanning cart
+    ids, so concurrent edits of different carts never rewrite a shared key.
+    """
+    ITEMS_KEY = 'cart-items:{cart_id}'
+    LOCK_KEY = 'cart-lock:{cart_id}'
+    DIRTY_KEY = 'cart-dirty:{cart_id}'
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+
+    @contextmanager
+    def locked(self, cart_id, wait=5, hold=5):
+        # Serializes edits of one cart so two tabs can't lose each other's read-modify-write
+        key = self.LOCK_KEY.format(cart_id=cart_id)
+        deadline = time.monotonic() + wait
+        while not cache.add(key, 1, timeout=hold):
+            if time.monotonic() > deadline:
+                raise ValidationError("The cart is being updated, please retry")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            cache.delete(key)
+
+    def read(self, cart_id):
+        key = self.ITEMS_KEY.format(cart_id=cart_id)
+        items = cache.get(key)
+        if items is None:
+            items = dict(CartItem.objects.filter(cart_id=cart_id).order_by('id').values_list('product_id', 'quantity'))
+            cache.set(key, items, timeout=self.timeout)
+        return items
+
+    def write(self, cart_id, items):
+        cache.set(self.ITEMS_KEY.format(cart_id=cart_id), items, timeout=self.timeout)
+        cache.set(self.DIRTY_KEY.format(cart_id=cart_id), 1, timeout=None)
+        bump_versions(f'cart:{cart_id}')
+
+    def dirty_carts(self, batch_size=1000):
+        dirty, last_id = [], None
+        while True:
+            carts = Cart.objects.order_by('pk')
+            if last_id is not None:
+                carts = carts.filter(pk__gt=last_id)
+            batch = list(carts.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return dirty
+            last_id = batch[-1]
+            keys = {self.DIRTY_KEY.format(cart_id=cart_id): cart_id for cart_id in batch}
+            dirty += [keys[key] for key in cache.get_many(list(keys))]
+
+    def build_lines(self, cart_id, items):
+        products = Product.objects.prefetch_related('images').in_bulk(list(items))
+        return [CartItem(id=product_id, cart_id=cart_id, product=products[product_id], quantity=quantity)
+                for product_id, quantity in items.items() if product_id in products]
+
+    def get_cart(self, user_id):
+        cart = Cart.objects.filter(user_id=user_id).first()
+        if cart is None:
+            cart, created = Cart.objects.get_or_create(user_id=user_id)
+        lines = self.build_lines(cart.pk, self.read(cart.pk))
+        cart.item_count = sum(line.quantity for line in lines)
+        cart.subtotal = sum((line.quantity * line.product.price for line in lines), Decimal('0.00'))
+        return attach_items(cart, lines)
+
+    def cache_scopes(self, user_id):
+        cart_id = Cart.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+        if cart_id is None:
+            return None
+        return [f'cart:{cart_id}'] + [f'product:{product_id}' for product_id in self.read(cart_id)]
+
+    def summary(self, user_id):
+        cart_id = Cart.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+        if cart_id is None:
+            return None
+        items = self.read(cart_id)
+        prices = dict(Product.objects.filter(id__in=list(items)).values_list('id', 'price'))
+        return {
+            'id': cart_id,
+            'item_count': sum(quantity for product_id, quantity in items.items() if product_id in prices),
+            'subtotal': sum((prices[product_id] * quantity for product_id, quantity in items.items() if product_id in prices),
+                            Decimal('0.00')),
+        }
+
+    def has_items(self, cart_id):
+        return bool(self.read(cart_id))
+
+    def lines(self, cart_id, product_ids=None):
+        items = self.read(cart_id)
+        if product_ids is not None:
+            items = {product_id: quantity for product_id, quantity in items.items() if product_id in product_ids}
+        return self.build_lines(cart_id, items)
+
+    def get_line(self, cart_id, item_id):
+        try:
+            product_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        quantity = self.read(cart_id).get(product_id)
+        product = Product.objects.filter(pk=product_id).first() if quantity else None
+        if product is None:
+            return None
+        return CartItem(id=product_id, cart_id=cart_id, product=product, quantity=quantity)
+
+    def add_items(self, cart_id, quantities):
+        with self.locked(cart_id):
+            ReservationService.reserve_many(cart_id, quantities)
+            items = self.read(cart_id)
+            for product_id, quantity in quantities.items():
+                items[product_id] = items.get(product_id, 0) + quantity
+            self.write(cart_id, items)
+
+    def set_quantity(self, line, quantity):
+        with self.locked(line.cart_id):
+            ReservationService.adjust(line.cart_id, line.product_id, quantity)
+            items = self.read(line.cart_id)
+            items[line.product_id] = quantity
+            self.write(line.cart_id, items)
+            line.quantity = quantity
+
+    def remove(self, line):
+        with self.locked(line.cart_id):
+            ReservationService.release(line.cart_id, line.product_id)
+            items = self.read(line.cart_id)
+            items.pop(line.product_id, None)
+            self.write(line.cart_id, items)
+
+    def flush(self, cart_id):
+        with self.locked(cart_id):
+            self.write_through(cart_id)
+
+    def write_through(self, cart_id):
+        """Write the cached lines through to `order_cartitem` and the cart's totals; the caller holds the cart's lock"""
+        items = self.read(cart_id)
+        existing = set(Product.objects.filter(id__in=list(items)).values_list('id', flat=True))
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id=cart_id).delete()
+            CartItem.objects.bulk_create([CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                                          for product_id, quantity in items.items() if product_id in existing])
+            CartService.refresh_totals([cart_id])
+        cache.delete(self.DIRTY_KEY.format(cart_id=cart_id))
+
+    @contextmanager
+    def checkout(self, cart_id):
+        """
+        Hold the cart's lock from the write-through until the order has committed and the cached cart is
+        cleared, so an edit can't land in between and be wiped with its reservation still held. Inside a
+        caller's transaction (an idempotent request) the clear waits for its commit; if that rolls back,
+        the cached cart stays and the lock runs out after `hold`.
+        """
+        lock = self.locked(cart_id, hold=60)
+        lock.__enter__()
+        try:
+            self.write_through(cart_id)
+            yield
+        except BaseException:
+            lock.__exit__(None, None, None)
+            raise
+
+        def clear():
+            cache.delete(self.ITEMS_KEY.format(cart_id=cart_id))
+            lock.__exit__(None, None, None)
+            bump_versions(f'cart:{cart_id}')
+        transaction.on_commit(clear)
+
+
+def get_cart_backend():
+    return import_string(getattr(settings, 'CART_BACKEND', 'order.cart_backends.DatabaseCartBackend'))()
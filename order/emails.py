@@ -1,23 +1,30 @@
-from django.core.mail import send_mail
-from django.conf import settings
+from uuid import UUID
+from order.models import Order
+from api.outbox import enqueue, register_renderer
 
 
-def send_order_confirmation_email(order):
-    subject = f"Grocera Order Confirmation"
-    message = f"""
+def queue_order_confirmation(order, email):
+    enqueue(to=email, kind='order_confirmation', payload={'order_id': str(order.id)})
+
+
+@register_renderer('order_confirmation')
+def render_order_confirmations(emails):
+    orders = Order.objects.select_related('user').prefetch_related('items__product').in_bulk(
+        [UUID(email.payload['order_id']) for email in emails])
+
+    rendered = {}
+    for email in emails:
+        order = orders.get(UUID(email.payload['order_id']))
+        if order is None:
+            continue
+        subject = f"Grocera Order Confirmation"
+        message = f"""
     Hi {order.user.first_name},
     Thank you for your order {order.user.first_name}!
     Order details:
     """
-    for item in order.items.all():
-        message += f"Product: {item.product.name}, Quantity: {item.quantity}, Price: {item.price}\n"
-    message += f"\nTotal Price: {order.total_price}\n\nWe will notify you once your order ships.\n\nBest regards,\nGrocera"
-
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[order.user.email],
-        fail_silently=False,
-    )
-    print(f"Sending order confirmation email to: {order.user.email}")
+        for item in order.items.all():
+            message += f"Product: {item.product.name}, Quantity: {item.quantity}, Price: {item.price}\n"
+        message += f"\nTotal Price: {order.total_price}\n\nWe will notify you once your order ships.\n\nBest regards,\nGrocera"
+        rendered[email.pk] = (subject, message)
+    return rendered
@@ -1,5 +1,9 @@
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from order.serializers import UpdateOrderSerializer, CartItemSerializer,CartSerializer, AddCartItemSerializer, UpdateCartItemSerializer, WishlistSerializer
+from order.serializers import UpdateOrderSerializer, WishlistBulkSerializer, OrderEventSerializer, BulkOrderStatusSerializer, BulkSellerOrderStatusSerializer, SellerOrderItemSerializer, UpdateSellerOrderSerializer, CartItemSerializer,CartSerializer, CartSummarySerializer, AddCartItemSerializer, AddCartItemsSerializer, UpdateCartItemSerializer, WishlistSerializer
+
+IDEMPOTENCY_KEY = openapi.Parameter('Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+                                    description="Retries with the same key return the first response")
 
 class OrderEndpoints:
     list = swagger_auto_schema(
@@ -22,8 +26,10 @@ class OrderEndpoints:
         operation_summary="Place a new order from a cart",
         operation_description=(
             "Requires authenticated user. Validates cart and user address. "
-            "Creates order and empties cart."
-        )
+            "Creates order and empties cart. Send an Idempotency-Key header to make retries safe: "
+            "a repeated key returns the first response instead of placing another order."
+        ),
+        manual_parameters=[IDEMPOTENCY_KEY]
     )
     
     cancel = swagger_auto_schema(
@@ -36,6 +42,18 @@ class OrderEndpoints:
         responses={200: 'Order canceled'}
     )
     
+    seller_items = swagger_auto_schema(
+        methods=['get'],
+        operation_summary="Seller's order lines, newest first",
+        operation_description=(
+            "Only the requesting seller's own order lines, cursor-paginated by (created_at, id). "
+            "Admins can pass seller_id to read another seller's feed."
+        ),
+        manual_parameters=[openapi.Parameter('seller_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                                             description="Admins only")],
+        responses={200: SellerOrderItemSerializer(many=True)}
+    )
+
     update_status = swagger_auto_schema(
         methods=['patch'],
         operation_summary="Admin updates order status",
@@ -44,6 +62,30 @@ class OrderEndpoints:
         responses={200: 'Order status updated'}
     )
     
+    has_ordered = swagger_auto_schema(
+        methods=['get'],
+        operation_summary="Which of these products has the user ordered",
+        operation_description=(
+            "Returns the subset of `product_ids` (comma separated, at most 100) that appear in any of the "
+            "requesting user's orders. One request per product grid instead of one per product card."
+        ),
+        manual_parameters=[openapi.Parameter('product_ids', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                             description="e.g. 1,2,3", required=True)],
+        responses={200: 'Ordered product ids'}
+    )
+
+    bulk_status = swagger_auto_schema(
+        methods=['post'],
+        operation_summary="Move many orders to one status",
+        operation_description=(
+            "Admins only. Up to 1000 order ids per request. Orders only move forward through fulfilment; "
+            "delivered and canceled orders are final. Each id gets its own result: updated, unchanged, "
+            "not_found or invalid_transition. Every change is recorded in the order's status history."
+        ),
+        request_body=BulkOrderStatusSerializer,
+        responses={200: 'Per-id results'}
+    )
+
     destroy = swagger_auto_schema(
         operation_summary="Delete an order",
         operation_description="Only admins can delete orders."
@@ -51,6 +93,64 @@ class OrderEndpoints:
 
 
 
+class SellerOrderEndpoints:
+    list = swagger_auto_schema(
+        operation_summary="Seller's fulfilment queue",
+        operation_description=(
+            "Sellers see their own share of each order, newest first. Filter with ?status=. "
+            "Admins see every seller's and can pass ?seller_id=."
+        ),
+        manual_parameters=[
+            openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('seller_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Admins only"),
+        ]
+    )
+
+    retrieve = swagger_auto_schema(
+        operation_summary="Get one seller order with its items"
+    )
+
+    update_status = swagger_auto_schema(
+        methods=['patch'],
+        operation_summary="Seller updates the status of their part of an order",
+        operation_description=(
+            "The parent order's status follows its least advanced seller order. "
+            "Canceled seller orders can not be updated."
+        ),
+        request_body=UpdateSellerOrderSerializer,
+        responses={200: 'Order status updated'}
+    )
+
+    bulk_status = swagger_auto_schema(
+        methods=['post'],
+        operation_summary="Move many seller orders to one status",
+        operation_description=(
+            "Up to 1000 seller order ids per request. Sellers can only move their own; other ids are "
+            "reported as not_found. Each id gets its own result and every change is recorded in the status history."
+        ),
+        request_body=BulkSellerOrderStatusSerializer,
+        responses={200: 'Per-id results'}
+    )
+
+
+
+class OrderEventEndpoints:
+    list = swagger_auto_schema(
+        operation_summary="Read the order event log",
+        operation_description=(
+            "Admins only. Order creations and status changes with an id above `after`, oldest first. "
+            "Pass the returned next_after as `after` to get the following events; the very newest "
+            "events are held back for a few seconds so none are ever skipped."
+        ),
+        manual_parameters=[
+            openapi.Parameter('after', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=0),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=500, description="At most 1000"),
+        ],
+        responses={200: OrderEventSerializer(many=True)}
+    )
+
+
+
 class CartEndpoints:
     list = swagger_auto_schema(
         operation_summary="Retrieve Cart",
@@ -58,6 +158,13 @@ class CartEndpoints:
         responses={200: CartSerializer}
     )
 
+    summary = swagger_auto_schema(
+        method='get',
+        operation_summary="Cart Summary",
+        operation_description="Item count and subtotal of the logged-in user's cart, read from the cart row alone. Meant for the header badge.",
+        responses={200: CartSummarySerializer}
+    )
+
     list_items = swagger_auto_schema(
         operation_summary="List Cart Items",
         operation_description="Lists all items in the specified cart, including product details, price, and quantity.",
@@ -72,28 +179,40 @@ class CartEndpoints:
 
     add = swagger_auto_schema(
         operation_summary="Add Item to Cart",
-        operation_description="Adds a specified product to the cart. If the product already exists, increase the quantity.",
+        operation_description="Adds a specified product to the cart. If the product already exists, increase the quantity. The units are reserved for the cart for STOCK_RESERVATION_TTL seconds; fails if not enough unreserved stock is available.",
         request_body=AddCartItemSerializer,
         responses={201: CartItemSerializer}
     )
 
+    add_batch = swagger_auto_schema(
+        method='post',
+        operation_summary="Add Items to Cart",
+        operation_description=(
+            "Adds many products at once, e.g. to reorder a previous order or add a recipe's ingredients. "
+            "Quantities are added to lines already in the cart. All lines are reserved and written together, "
+            "or none are if a product is missing or out of stock."
+        ),
+        request_body=AddCartItemsSerializer,
+        responses={201: 'The added cart lines under `items`, with their new quantities'}
+    )
+
     update = swagger_auto_schema(
         operation_summary="Update Cart Item",
-        operation_description="Update the quantity of a specific cart item. Quantity must be at least 1.",
+        operation_description="Update the quantity of a specific cart item. Quantity must be at least 1. The cart's reservation is grown or shrunk to match.",
         request_body=UpdateCartItemSerializer,
         responses={200: CartItemSerializer}
     )
 
     remove = swagger_auto_schema(
         operation_summary="Remove Cart Item",
-        operation_description="Removes a product from the user's cart.",
+        operation_description="Removes a product from the user's cart and releases its reserved stock.",
         responses={204: 'No Content'}
     )
 
 class WishlistEndpoints:
     list = swagger_auto_schema(
         operation_summary="List Wishlist Items",
-        operation_description="Retrieve all items in the logged-in user's wishlist.",
+        operation_description="Retrieve all items in the logged-in user's wishlist, each with a compact product (primary image, seller name, rating).",
         responses={200: WishlistSerializer(many=True)}
     )
 
@@ -123,3 +242,25 @@ class WishlistEndpoints:
         responses={204: 'No Content'}
     )
 
+    ids = swagger_auto_schema(
+        methods=['get'],
+        operation_summary="Wishlisted product ids",
+        operation_description="Just the ids of every product in the logged-in user's wishlist, unpaginated, for rendering heart icons.",
+        responses={200: 'Product ids'}
+    )
+
+    bulk_add = swagger_auto_schema(
+        methods=['post'],
+        operation_summary="Add many products to the wishlist",
+        operation_description="Up to 200 product ids. Products already in the wishlist are skipped; unknown ids are returned in not_found.",
+        request_body=WishlistBulkSerializer,
+        responses={200: 'Wishlisted and unknown product ids'}
+    )
+
+    bulk_remove = swagger_auto_schema(
+        methods=['post'],
+        operation_summary="Remove many products from the wishlist",
+        operation_description="Up to 200 product ids. Ids not in the wishlist are ignored.",
+        request_body=WishlistBulkSerializer,
+        responses={200: 'Number of items removed'}
+    )
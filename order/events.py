@@ -0,0 +1,56 @@
+from datetime import timedelta
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from order.services import upsert_increment
+from order.models import OrderStatusHistory, OrderEventCheckpoint, OrderDailyStatusCount
+
+
+def committed_events(after_id=0, limit=1000):
+    """
+    Events with an id above `after_id`, oldest first. Ids are handed out before commit, so a slow
+    transaction can commit a lower id after a higher one has been read; the batch therefore stops at
+    the first event younger than ORDER_EVENT_SAFETY_LAG, and a reader resuming from the last id it
+    saw never skips one.
+    """
+    horizon = timezone.now() - timedelta(seconds=getattr(settings, 'ORDER_EVENT_SAFETY_LAG', 30))
+    events = []
+    for event in OrderStatusHistory.objects.filter(pk__gt=after_id).order_by('pk')[:limit]:
+        if event.changed_at > horizon:
+            break
+        events.append(event)
+    return events
+
+
+def consume(name, handler, batch_size=1000):
+    """
+    Feed the events after checkpoint `name` to `handler(events)` a batch at a time. The checkpoint moves
+    in the same transaction as the handler's writes, so each event is applied exactly once.
+    """
+    OrderEventCheckpoint.objects.get_or_create(name=name)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            checkpoint = OrderEventCheckpoint.objects.select_for_update().get(name=name)
+            events = committed_events(checkpoint.last_event_id, batch_size)
+            if not events:
+                return processed
+            handler(events)
+            checkpoint.last_event_id = events[-1].pk
+            checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+        processed += len(events)
+
+
+def count_daily_statuses(events):
+    counts = Counter((timezone.localdate(event.changed_at), event.to_status)
+                     for event in events if event.seller_order_id is None)
+    if counts:
+        upsert_increment(OrderDailyStatusCount, [{'day': day, 'status': status, 'count': count}
+                                                 for (day, status), count in counts.items()],
+                         unique_fields=['day', 'status'], increment='count')
+
+
+CONSUMERS = {
+    'daily_status_counts': count_daily_statuses,
+}
@@ -0,0 +1,79 @@
+import time
+import threading
+from uuid import uuid4
+from django.db import connection
+from api.models import OutboxEmail
+from order.models import Cart, CartItem
+from order.services import OrderService
+from django.contrib.auth import get_user_model
+from product.models import Product, Category
+from rest_framework.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Check out one hot product from many threads at once and verify it is never oversold"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=50)
+        parser.add_argument('--stock', type=int, default=20, help="Starting stock of the hot product")
+        parser.add_argument('--quantity', type=int, default=1, help="Units per checkout")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stderr.write("SQLite serializes all writers, run this against PostgreSQL for a meaningful result")
+
+        run = uuid4().hex[:8]
+        User = get_user_model()
+        seller = User.objects.create_user(email=f'bench-seller-{run}@example.com', password=None)
+        category = Category.objects.create(name=f'bench-{run}')
+        product = Product.objects.create(seller=seller, category=category, name=f'hot sku {run}',
+                                         price=1, stock=options['stock'])
+        buyers = User.objects.bulk_create([
+            User(email=f'bench-buyer-{run}-{i}@example.com', address='bench', balance=options['quantity'])
+            for i in range(options['threads'])
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=buyer) for buyer in buyers])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=options['quantity']) for cart in carts])
+
+        outcomes = {'placed': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def checkout(buyer, cart):
+            outcome = 'placed'
+            try:
+                barrier.wait()
+                OrderService.create_order(user_id=buyer.pk, cart_id=cart.pk)
+            except ValidationError:
+                outcome = 'rejected'
+            except Exception as e:
+                outcome = 'errors'
+                self.stderr.write(f"{type(e).__name__}: {e}")
+            finally:
+                connection.close()
+            with lock:
+                outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=checkout, args=pair) for pair in zip(buyers, carts)]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            product.refresh_from_db()
+            sold = options['stock'] - product.stock
+            self.stdout.write(f"{options['threads']} checkouts in {elapsed:.2f}s: "
+                              f"{outcomes['placed']} placed, {outcomes['rejected']} rejected, {outcomes['errors']} errors")
+            self.stdout.write(f"stock {options['stock']} -> {product.stock}, units sold {sold}")
+            expected = min(options['threads'], options['stock'] // options['quantity'])
+            if product.stock < 0 or sold != outcomes['placed'] * options['quantity'] or outcomes['placed'] > expected:
+                raise CommandError("Oversold: stock and placed orders disagree")
+            self.stdout.write(self.style.SUCCESS("No overselling"))
+        finally:
+            OutboxEmail.objects.filter(to__in=[buyer.email for buyer in buyers]).delete()
+            User.objects.filter(pk__in=[seller.pk] + [buyer.pk for buyer in buyers]).delete()
+            category.delete()
@@ -0,0 +1,13 @@
+from order.cart_backends import get_cart_backend
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Write carts edited in the cache through to the database. Only does work with CacheCartBackend"
+
+    def handle(self, *args, **options):
+        backend = get_cart_backend()
+        cart_ids = backend.dirty_carts()
+        for cart_id in cart_ids:
+            backend.flush(cart_id)
+        self.stdout.write(self.style.SUCCESS(f"Flushed {len(cart_ids)} carts"))
@@ -0,0 +1,25 @@
+import time
+from order.events import CONSUMERS, consume
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Apply new order events to the reports built from them, resuming from each report's checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', choices=sorted(CONSUMERS), action='append',
+                            help="Only run this consumer (can be repeated). Defaults to all of them")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting once caught up")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        names = options['consumer'] or sorted(CONSUMERS)
+        while True:
+            for name in names:
+                processed = consume(name, CONSUMERS[name], batch_size=options['batch_size'])
+                if processed or not options['loop']:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: processed {processed} events"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+from order.services import ReservationService
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Release stock held by cart reservations past their expiry. Meant to run every minute or so from cron"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Also recompute Product.reserved_stock from the remaining reservations")
+
+    def handle(self, *args, **options):
+        released = ReservationService.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired reservations"))
+        if options['rebuild']:
+            ReservationService.rebuild()
+            self.stdout.write(self.style.SUCCESS("Rebuilt reserved stock"))
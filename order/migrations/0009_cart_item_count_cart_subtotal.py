@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:44
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('order', 'Cart')
+    CartItem = apps.get_model('order', 'CartItem')
+    items = CartItem.objects.filter(cart_id=OuterRef('pk')).order_by().values('cart_id')
+    Cart.objects.update(
+        item_count=Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0),
+        subtotal=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('product__price'))).values('total')),
+                          Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_seller_and_created_at(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    Product = apps.get_model('product', 'Product')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    OrderItem.objects.update(
+        seller_id=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('seller_id')[:1]),
+        created_at=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0009_cart_item_count_cart_subtotal'),
+        ('product', '0007_product_reserved_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='seller',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sold_items', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(backfill_seller_and_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='seller',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='sold_items', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['seller', '-created_at', '-id'], name='orderitem_seller_created_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+
+def split_orders_by_seller(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    SellerOrder = apps.get_model('order', 'SellerOrder')
+    groups = (OrderItem.objects.order_by().values('order_id', 'seller_id')
+              .annotate(total=Sum('total_price'), count=Count('id')))
+    orders = Order.objects.in_bulk({group['order_id'] for group in groups})
+    SellerOrder.objects.bulk_create([
+        SellerOrder(order_id=group['order_id'], seller_id=group['seller_id'], total_price=group['total'],
+                    item_count=group['count'], status=orders[group['order_id']].status,
+                    created_at=orders[group['order_id']].created_at)
+        for group in groups
+    ], batch_size=1000)
+    OrderItem.objects.update(seller_order_id=Subquery(
+        SellerOrder.objects.filter(order_id=OuterRef('order_id'), seller_id=OuterRef('seller_id')).values('id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0010_orderitem_seller_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Shipped', 'Shipped'), ('Out for Delivery', 'Out for Delivery'), ('Delivered', 'Delivered'), ('Canceled', 'Canceled')], default='Pending', max_length=20)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_orders', to='order.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'status', '-created_at', '-id'], name='sellerorder_queue_idx'), models.Index(fields=['seller', '-created_at', '-id'], name='sellerorder_created_idx')],
+                'unique_together': {('order', 'seller')},
+            },
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='seller_order',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='order.sellerorder'),
+        ),
+        migrations.RunPython(split_orders_by_seller, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='seller_order',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='order.sellerorder'),
+        ),
+    ]
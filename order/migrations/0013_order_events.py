@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_creation_events(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    SellerOrder = apps.get_model('order', 'SellerOrder')
+    OrderStatusHistory = apps.get_model('order', 'OrderStatusHistory')
+    events = [OrderStatusHistory(order_id=order_id, from_status='', to_status='Pending', changed_at=created_at)
+              for order_id, created_at in Order.objects.values_list('id', 'created_at').iterator()]
+    events += [OrderStatusHistory(order_id=order_id, seller_order_id=seller_order_id, from_status='',
+                                  to_status='Pending', changed_at=created_at)
+               for seller_order_id, order_id, created_at
+               in SellerOrder.objects.values_list('id', 'order_id', 'created_at').iterator()]
+    events.sort(key=lambda event: event.changed_at)
+    OrderStatusHistory.objects.bulk_create(events, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0012_orderstatushistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Shipped', 'Shipped'), ('Out for Delivery', 'Out for Delivery'), ('Delivered', 'Delivered'), ('Canceled', 'Canceled')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderEventCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='orderstatushistory',
+            name='from_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Shipped', 'Shipped'), ('Out for Delivery', 'Out for Delivery'), ('Delivered', 'Delivered'), ('Canceled', 'Canceled')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatushistory',
+            index=models.Index(fields=['changed_at'], name='statushistory_changed_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderdailystatuscount',
+            unique_together={('day', 'status')},
+        ),
+        migrations.RunPython(backfill_creation_events, migrations.RunPython.noop),
+    ]
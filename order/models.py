@@ -1,6 +1,7 @@
 from uuid import uuid4
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from product.models import Product
 from django.core.validators import MinValueValidator
 
@@ -13,6 +14,9 @@ class Wishlist(models.Model):
 
     class Meta:
         unique_together = [['user', 'product']]
+        indexes = [
+            models.Index(fields=['user', '-added_at', '-id'], name='wishlist_user_added_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} in {self.user.email}'s wishlist"
@@ -22,6 +26,8 @@ class Wishlist(models.Model):
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cart")
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
 
     def __str__(self):
         return f"{self.user.first_name}'s Cart"
@@ -39,6 +45,23 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
 
 
+class StockReservation(models.Model):
+    """Units of a product held for a cart until `expires_at`; mirrored in `Product.reserved_stock`"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="reservations")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['cart', 'product']]
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for cart {self.cart_id}"
+
+
 
 
 class Order(models.Model):
@@ -56,6 +79,16 @@ class Order(models.Model):
         (DELIVERED, 'Delivered'),
         (CANCELED, 'Canceled')
     ]
+    # Fulfilment only moves forward; delivered and canceled orders are final
+    FLOW = [PENDING, PROCESSING, SHIPPED, OUT_FOR_DELIVERY, DELIVERED]
+    TRANSITIONS = {
+        PENDING: {PROCESSING, SHIPPED, OUT_FOR_DELIVERY, DELIVERED, CANCELED},
+        PROCESSING: {SHIPPED, OUT_FOR_DELIVERY, DELIVERED, CANCELED},
+        SHIPPED: {OUT_FOR_DELIVERY, DELIVERED, CANCELED},
+        OUT_FOR_DELIVERY: {DELIVERED, CANCELED},
+        DELIVERED: set(),
+        CANCELED: set(),
+    }
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="orders")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
@@ -63,19 +96,107 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_id_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.first_name} - {self.status}"
 
 
 
+class SellerOrder(models.Model):
+    """One seller's share of an order, fulfilled and tracked independently of the other sellers'"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="seller_orders")
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="seller_orders")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, default=Order.PENDING)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    item_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['order', 'seller']]
+        indexes = [
+            models.Index(fields=['seller', 'status', '-created_at', '-id'], name='sellerorder_queue_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='sellerorder_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} for seller {self.seller_id} - {self.status}"
+
+
+class OrderStatusHistory(models.Model):
+    """
+    Append-only order event log: one row when an order (and each of its seller orders) is created,
+    with an empty `from_status`, and one per status transition after that. `seller_order` is set when
+    one seller's part changed. Reporting jobs read it incrementally by id, see order/events.py.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="status_history")
+    seller_order = models.ForeignKey(SellerOrder, on_delete=models.CASCADE, null=True, blank=True, related_name="status_history")
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'changed_at'], name='statushistory_order_idx'),
+            models.Index(fields=['changed_at'], name='statushistory_changed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order status history is append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status}"
+
+
+class OrderEventCheckpoint(models.Model):
+    """How far a named consumer of the order event log has got"""
+    name = models.CharField(max_length=100, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at event {self.last_event_id}"
+
+
+class OrderDailyStatusCount(models.Model):
+    """Orders that entered each status per day, maintained incrementally from the event log"""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['day', 'status']]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.count}"
+
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order, on_delete=models.CASCADE, related_name="items")
+    seller_order = models.ForeignKey(SellerOrder, on_delete=models.CASCADE, related_name="items", editable=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Copied from the product and order at checkout so seller reads never join through them
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sold_items', editable=False)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', '-created_at', '-id'], name='orderitem_seller_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
\ No newline at end of file
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import cache
+from order.models import OrderItem
+from api.caching import bump_versions, get_versions
+
+PURCHASED_KEY = 'purchased-products:{user_id}:{version}'
+
+
+def purchases_scope(user_id):
+    return f'purchases:{user_id}'
+
+
+def purchased_product_ids(user_id):
+    """
+    Ids of every product the user has ordered, cached per user. The key carries the version of the
+    user's `purchases:` scope, so a checkout's bump retires it and a set computed before the new order
+    committed can't be stored under the current version.
+    """
+    scope = purchases_scope(user_id)
+    key = PURCHASED_KEY.format(user_id=user_id, version=get_versions([scope])[scope])
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = frozenset(OrderItem.objects.filter(order__user_id=user_id).values_list('product_id', flat=True).distinct())
+        cache.set(key, product_ids, timeout=getattr(settings, 'PURCHASED_PRODUCTS_CACHE_TIMEOUT', 60 * 5))
+    return product_ids
+
+
+def invalidate_purchases(user_id):
+    bump_versions(purchases_scope(user_id))
@@ -1,13 +1,13 @@
 from product.models import Product
 from rest_framework import serializers
-from order.services import OrderService
-from order.emails import send_order_confirmation_email
-from order.models import  Order, OrderItem, Wishlist, Cart, CartItem
-from product.serializers import ProductSerializer, ProductImageSerializer
+from order.services import OrderService, OrderStatusService
+from order.cart_backends import get_cart_backend
+from order.models import  Order, OrderItem, OrderStatusHistory, SellerOrder, Wishlist, Cart, CartItem
+from product.serializers import ProductListSerializer, ProductImageSerializer
 
 
 class WishlistSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = ProductListSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
         write_only=True,
@@ -19,6 +19,10 @@ class WishlistSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_id', 'added_at']
 
 
+class WishlistBulkSerializer(serializers.Serializer):
+    product_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=200)
+
+
 
 class SimpleProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
@@ -43,15 +47,18 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField(method_name='get_total_price')
+    total_price = serializers.DecimalField(source='subtotal', max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'total_price']
+        fields = ['id', 'user', 'items', 'item_count', 'total_price']
         read_only_fields = ['user']
 
-    def get_total_price(self, cart: Cart):
-        return sum([item.product.price * item.quantity for item in cart.items.all()])
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cart
+        fields = ['id', 'item_count', 'subtotal']
     
 
 class AddCartItemSerializer(serializers.ModelSerializer):
@@ -60,23 +67,36 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id', 'product_id','quantity']
 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError(f"Product with {value} doesnot exists")
-        return value
-
     def create(self, validated_data):
         cart_id = self.context['cart_id']
         product_id = validated_data['product_id']
-        quantity = validated_data['quantity']
 
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            return cart_item
-        except CartItem.DoesNotExist:
-            return CartItem.objects.create(cart_id=cart_id, **validated_data)
+        # The product's existence is checked by the reservation, which locks its row anyway
+        backend = get_cart_backend()
+        backend.add_items(cart_id, {product_id: validated_data['quantity']})
+        return backend.lines(cart_id, product_ids=[product_id])[0]
+
+
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class AddCartItemsSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True, allow_empty=False, max_length=200)
+
+    def create(self, validated_data):
+        cart_id = self.context['cart_id']
+        quantities = {}
+        for line in validated_data['items']:
+            quantities[line['product_id']] = quantities.get(line['product_id'], 0) + line['quantity']
+
+        backend = get_cart_backend()
+        backend.add_items(cart_id, quantities)
+        return backend.lines(cart_id, product_ids=quantities)
+
+    def to_representation(self, instance):
+        return {'items': CartItemSerializer(instance, many=True).data}
         
 
 
@@ -84,13 +104,17 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
+
+    def update(self, instance, validated_data):
+        get_cart_backend().set_quantity(instance, validated_data['quantity'])
+        return instance
     
 
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
     def validate_cart_id(self, cart_id):
-        if not CartItem.objects.filter(cart_id=cart_id).exists():
+        if not get_cart_backend().has_items(cart_id):
             raise serializers.ValidationError('Cart is empty')
         return cart_id
 
@@ -116,12 +140,27 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'price', 'quantity', 'total_price']
 
 
+class SellerOrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name')
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'order_id', 'product_id', 'product_name', 'price', 'quantity', 'total_price', 'created_at']
+
+
+class SellerOrderStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SellerOrder
+        fields = ['id', 'seller', 'status', 'total_price']
+
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
+    seller_orders = SellerOrderStatusSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
+        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'seller_orders', 'items']
 
 
 
@@ -131,7 +170,7 @@ class CreateOrderSerializer(serializers.Serializer):
     def validate_cart_id(self, cart_id):
         if not Cart.objects.filter(pk=cart_id).exists():
             raise serializers.ValidationError('No cart found')
-        if not CartItem.objects.filter(cart_id=cart_id).exists():
+        if not get_cart_backend().has_items(cart_id):
             raise serializers.ValidationError('Cart is empty')
         return cart_id
     
@@ -141,7 +180,6 @@ class CreateOrderSerializer(serializers.Serializer):
 
         try:
             order = OrderService.create_order(user_id=user_id, cart_id=cart_id)
-            send_order_confirmation_email(order)
             return order
         except ValueError as e:
             raise serializers.ValidationError(str(e))
@@ -157,6 +195,41 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['status']
 
+    def update(self, instance, validated_data):
+        return OrderStatusService.transition_one(instance, validated_data['status'], self.context.get('user'))
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderStatusHistory
+        fields = ['id', 'order', 'seller_order', 'from_status', 'to_status', 'changed_by', 'changed_at']
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=1000)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class SellerOrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True)
+
+    class Meta:
+        model = SellerOrder
+        fields = ['id', 'order', 'seller', 'status', 'total_price', 'item_count', 'created_at', 'updated_at', 'items']
+
+
+class UpdateSellerOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SellerOrder
+        fields = ['status']
+
+    def update(self, instance, validated_data):
+        return OrderStatusService.transition_one(instance, validated_data['status'], self.context.get('user'))
+
+
+class BulkSellerOrderStatusSerializer(BulkOrderStatusSerializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=1000)
+
 
 class EmptySerializer(serializers.Serializer):
     pass
@@ -1,66 +1,428 @@
-from users.models import User, Deposit
-from django.db import transaction
-from order.models import Cart, OrderItem, Order
+from decimal import Decimal
+from datetime import timedelta
+from django.conf import settings
+from users.services import LedgerService
+from users.models import User, Deposit, LedgerEntry
+from django.db import connection, transaction
+from django.utils import timezone
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from product.models import Product
+from api.caching import bump_versions, invalidate_catalog
+from order.models import Cart, CartItem, OrderItem, Order, OrderStatusHistory, SellerOrder, StockReservation
+from order.emails import queue_order_confirmation
+from order.purchases import invalidate_purchases
 from rest_framework.exceptions import PermissionDenied, ValidationError
 
 
+def upsert_increment(model, rows, unique_fields, increment, replace=()):
+    """
+    Insert `rows` (dicts keyed by field name) in one statement. A row that hits the unique constraint on
+    `unique_fields` adds its `increment` column to the existing row and overwrites its `replace` columns.
+    """
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    table, quote = model._meta.db_table, connection.ops.quote_name
+    column = {field.name: quote(field.column) for field in fields}
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in unique_fields)
+    updates = [f"{column[increment]} = {quote(table)}.{column[increment]} + excluded.{column[increment]}"]
+    updates += [f"{column[name]} = excluded.{column[name]}" for name in replace]
+    values = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+    params = [field.get_db_prep_value(row[field.name], connection) for row in rows for field in fields]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(table)} ({', '.join(column.values())}) VALUES {values} "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {', '.join(updates)}", params)
+
+
 class OrderService:
     @staticmethod
     def create_order(user_id, cart_id):
-        with transaction.atomic():
-            cart = Cart.objects.get(pk=cart_id)
-            cart_items = cart.items.select_related('product').all()
-            user = User.objects.get(pk=user_id)
-            total_price = sum([item.product.price * item.quantity for item in cart_items])
-            
-            if user.balance < total_price:
-                raise ValidationError("Insufficient balance. Please deposit more funds.")
+        """
+        Products are locked in id order so concurrent checkouts queue on the same rows instead of deadlocking.
+        Stock and balance are then written with conditional UPDATEs, so neither can go negative even without locks.
+        Units the cart reserved count towards its own availability and are converted into the order.
+        """
+        from order.cart_backends import get_cart_backend
+
+        with get_cart_backend().checkout(cart_id), transaction.atomic():
+            quantities = dict(CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity'))
+            if not quantities:
+                raise ValidationError("Cart is empty")
+            products = list(Product.objects.select_for_update().filter(id__in=quantities).order_by('id')
+                            .only('id', 'seller_id', 'name', 'price', 'stock', 'reserved_stock', 'category_id'))
+            reserved = dict(StockReservation.objects.filter(cart_id=cart_id, product_id__in=quantities)
+                            .values_list('product_id', 'quantity'))
+            total_price = sum(product.price * quantities[product.id] for product in products)
+
+            for product in products:
+                if product.stock - product.reserved_stock + reserved.get(product.id, 0) < quantities[product.id]:
+                    raise ValidationError(f"Not enough stock for product {product.name}")
+            user = User.objects.only('email', 'address').get(pk=user_id)
             if not user.address:
                 raise ValidationError("Address is required for order confirmation.")
-            
-            user.balance -= total_price
-            user.save()
-            Deposit.objects.create(
-                user=user,
+
+            in_stock = Q()
+            for product_id, quantity in quantities.items():
+                in_stock |= Q(id=product_id, stock__gte=F('reserved_stock') - reserved.get(product_id, 0) + quantity)
+            decremented = Product.objects.filter(in_stock).update(
+                stock=Case(
+                    *[When(id=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                    default=F('stock'), output_field=Product._meta.get_field('stock')),
+                reserved_stock=Case(
+                    *[When(id=product_id, then=F('reserved_stock') - quantity) for product_id, quantity in reserved.items()],
+                    default=F('reserved_stock'), output_field=Product._meta.get_field('reserved_stock')))
+            if decremented != len(quantities):
+                raise ValidationError("Not enough stock for one or more products")
+            StockReservation.objects.filter(cart_id=cart_id, product_id__in=quantities).delete()
+
+            deposit = Deposit.objects.create(
+                user_id=user_id,
                 amount=-total_price,
                 status='order_placed',
                 transaction_reference=f"order_{cart_id}"
             )
-
             order = Order.objects.create(user_id=user_id, total_price=total_price)
-            order_items = []
-            for item in cart_items:
-                if item.product.stock < item.quantity:
-                    raise ValidationError(f"Not enough stock for product {item.product.name}")
-                
-                order_items.append(OrderItem(
+            # Conditional on the balance covering the total, so it can't go negative even without locks
+            LedgerService.post(user_id, -total_price, LedgerEntry.ORDER, deposit=deposit, order=order, require_funds=True)
+            seller_orders = OrderService.split_by_seller(order, products, quantities)
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product=item.product,
-                    price=item.product.price,
-                    quantity=item.quantity,
-                    total_price=item.product.price * item.quantity
-                ))
-                item.product.stock -= item.quantity
-                item.product.save()
+                    seller_order=seller_orders[product.seller_id],
+                    product=product,
+                    seller_id=product.seller_id,
+                    created_at=order.created_at,
+                    price=product.price,
+                    quantity=quantities[product.id],
+                    total_price=product.price * quantities[product.id]
+                ) for product in products
+            ])
+            CartItem.objects.filter(cart_id=cart_id).delete()
+            Cart.objects.filter(pk=cart_id).update(item_count=0, subtotal=0)
+            # Last, so the events get their ids and timestamps just before the commit
+            now = timezone.now()
+            OrderStatusHistory.objects.bulk_create(
+                [OrderStatusHistory(order=order, to_status=order.status, changed_by_id=user_id, changed_at=now)] +
+                [OrderStatusHistory(order=order, seller_order=seller_order, to_status=seller_order.status,
+                                    changed_by_id=user_id, changed_at=now)
+                 for seller_order in seller_orders.values()])
+            queue_order_confirmation(order, user.email)
 
-            OrderItem.objects.bulk_create(order_items)
-            cart.items.all().delete()
-            return order
+        invalidate_purchases(user_id)
+        # The stock UPDATE skips model signals, so cached catalog reads are invalidated here
+        invalidate_catalog(product_ids=quantities, category_ids={product.category_id for product in products})
+        return order
 
     @staticmethod
-    def cancel_order(order, user):
-        if user.is_staff:
-            order.status = Order.CANCELED
-            order.save()
-            return order
+    def split_by_seller(order, products, quantities):
+        """Create one SellerOrder per seller in the order and return them keyed by seller id"""
+        groups = {}
+        for product in products:
+            total, count = groups.get(product.seller_id, (Decimal('0.00'), 0))
+            groups[product.seller_id] = (total + product.price * quantities[product.id], count + 1)
+        seller_orders = SellerOrder.objects.bulk_create([
+            SellerOrder(order=order, seller_id=seller_id, total_price=total, item_count=count, created_at=order.created_at)
+            for seller_id, (total, count) in groups.items()
+        ])
+        return {seller_order.seller_id: seller_order for seller_order in seller_orders}
 
-        if order.user != user:
+    @staticmethod
+    def cancel_order(order, user):
+        if not user.is_staff and order.user != user:
             raise PermissionDenied(
                 {"detail": "You can only cancel your own order"})
 
         if order.status == Order.DELIVERED:
             raise ValidationError({"detail": "You can not cancel an order"})
 
-        order.status = Order.CANCELED
-        order.save()
+        OrderStatusService.transition_one(order, Order.CANCELED, user)
         return order
+
+
+class OrderStatusService:
+    """
+    Status changes for orders and seller orders, one or many at a time. Each call validates ownership
+    and transitions with one locking SELECT, writes every accepted change with a single UPDATE and
+    records it in OrderStatusHistory. Results are reported per id.
+    """
+    UPDATED, UNCHANGED, NOT_FOUND, INVALID = 'updated', 'unchanged', 'not_found', 'invalid_transition'
+
+    @staticmethod
+    def plan(ids, current, status):
+        """Split `ids` by what would happen to each; `current` maps the ids found to their status"""
+        results, accepted = [], []
+        for pk in ids:
+            if pk not in current:
+                results.append({'id': pk, 'result': OrderStatusService.NOT_FOUND})
+            elif current[pk] == status:
+                results.append({'id': pk, 'result': OrderStatusService.UNCHANGED, 'status': status})
+            elif status not in Order.TRANSITIONS[current[pk]]:
+                results.append({'id': pk, 'result': OrderStatusService.INVALID, 'status': current[pk],
+                                'detail': f"Can not move from {current[pk]} to {status}"})
+            else:
+                results.append({'id': pk, 'result': OrderStatusService.UPDATED, 'status': status, 'previous': current[pk]})
+                accepted.append(pk)
+        return results, accepted
+
+    @staticmethod
+    def transition_orders(order_ids, status, user=None):
+        """Move whole orders, and those of their seller orders that can get there, to `status`"""
+        order_ids = list(dict.fromkeys(order_ids))
+        with transaction.atomic():
+            current = dict(Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk').values_list('pk', 'status'))
+            results, accepted = OrderStatusService.plan(order_ids, current, status)
+            if accepted:
+                # Seller orders already past `status` (or final) keep theirs
+                reachable = [current for current, targets in Order.TRANSITIONS.items() if status in targets]
+                cascaded = list(SellerOrder.objects.select_for_update().filter(order_id__in=accepted, status__in=reachable)
+                                .order_by('pk').values_list('pk', 'order_id', 'status'))
+                # Taken once the locks are held, so a lock wait can't age the events past the readers' safety lag
+                now = timezone.now()
+                Order.objects.filter(pk__in=accepted).update(status=status, updated_at=now)
+                SellerOrder.objects.filter(pk__in=[pk for pk, _, _ in cascaded]).update(status=status, updated_at=now)
+                OrderStatusHistory.objects.bulk_create(
+                    [OrderStatusHistory(order_id=pk, from_status=current[pk], to_status=status, changed_by=user, changed_at=now)
+                     for pk in accepted] +
+                    [OrderStatusHistory(order_id=order_id, seller_order_id=pk, from_status=previous, to_status=status,
+                                        changed_by=user, changed_at=now)
+                     for pk, order_id, previous in cascaded])
+        return results
+
+    @staticmethod
+    def transition_seller_orders(seller_order_ids, status, user=None, seller_id=None):
+        """Move seller orders (only `seller_id`'s, if given) to `status` and roll their orders' status up"""
+        seller_order_ids = list(dict.fromkeys(seller_order_ids))
+        owned = SellerOrder.objects.filter(pk__in=seller_order_ids)
+        if seller_id is not None:
+            owned = owned.filter(seller_id=seller_id)
+        with transaction.atomic():
+            # Orders before seller orders, the same lock order as transition_orders
+            order_ids = list(owned.order_by().values_list('order_id', flat=True).distinct())
+            list(Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk').values_list('pk', flat=True))
+            rows = {pk: (order_id, current) for pk, order_id, current
+                    in owned.select_for_update().order_by('pk').values_list('pk', 'order_id', 'status')}
+            results, accepted = OrderStatusService.plan(
+                seller_order_ids, {pk: current for pk, (order_id, current) in rows.items()}, status)
+            if accepted:
+                now = timezone.now()
+                SellerOrder.objects.filter(pk__in=accepted).update(status=status, updated_at=now)
+                rolled_up = OrderStatusService.rollup({rows[pk][0] for pk in accepted}, now)
+                OrderStatusHistory.objects.bulk_create(
+                    [OrderStatusHistory(order_id=rows[pk][0], seller_order_id=pk, from_status=rows[pk][1],
+                                        to_status=status, changed_by=user, changed_at=now)
+                     for pk in accepted] +
+                    [OrderStatusHistory(order_id=order_id, from_status=previous, to_status=rolled,
+                                        changed_by=user, changed_at=now)
+                     for order_id, previous, rolled in rolled_up])
+        return results
+
+    @staticmethod
+    def rollup(order_ids, now=None):
+        """
+        An order is as far along as its least advanced seller order that isn't canceled. Returns the
+        (order id, previous status, new status) of every order that moved, for the caller to record.
+        """
+        found = {}
+        for order_id, status in SellerOrder.objects.filter(order_id__in=order_ids).values_list('order_id', 'status'):
+            found.setdefault(order_id, set()).add(status)
+        current = dict(Order.objects.filter(pk__in=list(found)).values_list('pk', 'status'))
+        changes = []
+        for order_id, statuses in found.items():
+            active = [status for status in Order.FLOW if status in statuses]
+            rolled = active[0] if active else Order.CANCELED
+            if current[order_id] != rolled:
+                changes.append((order_id, current[order_id], rolled))
+        by_status = {}
+        for order_id, previous, rolled in changes:
+            by_status.setdefault(rolled, []).append(order_id)
+        for status, ids in by_status.items():
+            Order.objects.filter(pk__in=ids).update(status=status, updated_at=now or timezone.now())
+        return changes
+
+    @staticmethod
+    def transition_one(instance, status, user=None):
+        """Single-object transition for detail endpoints; raises ValidationError instead of reporting"""
+        if isinstance(instance, SellerOrder):
+            result, = OrderStatusService.transition_seller_orders([instance.pk], status, user)
+        else:
+            result, = OrderStatusService.transition_orders([instance.pk], status, user)
+        if result['result'] == OrderStatusService.INVALID:
+            raise ValidationError({"status": result['detail']})
+        if result['result'] == OrderStatusService.NOT_FOUND:
+            raise ValidationError({"status": "Order not found"})
+        instance.status = status
+        return instance
+
+
+class CartService:
+    @staticmethod
+    def refresh_totals(cart_ids):
+        """
+        Recompute `item_count` and `subtotal` of the given carts from their items with one UPDATE.
+        The carts are locked first so the UPDATE sees items committed by any writer it waited for.
+        """
+        cart_ids = list(cart_ids)
+        if not cart_ids:
+            return
+        with transaction.atomic():
+            list(Cart.objects.select_for_update().filter(pk__in=cart_ids).order_by('pk').values_list('pk', flat=True))
+            items = CartItem.objects.filter(cart_id=OuterRef('pk')).order_by().values('cart_id')
+            Cart.objects.filter(pk__in=cart_ids).update(
+                item_count=Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0),
+                subtotal=Coalesce(
+                    Subquery(items.annotate(total=Sum(F('quantity') * F('product__price'))).values('total')),
+                    Value(Decimal('0.00')), output_field=Cart._meta.get_field('subtotal')),
+            )
+
+    @staticmethod
+    def add_items(cart_id, quantities):
+        """
+        Add `{product_id: quantity}` to the cart: reserve the stock, then upsert every line with one
+        INSERT ... ON CONFLICT, so concurrent adds of the same product sum up instead of overwriting.
+        """
+        with transaction.atomic():
+            ReservationService.reserve_many(cart_id, quantities)
+            upsert_increment(CartItem, [{'cart': cart_id, 'product': product_id, 'quantity': quantity}
+                                        for product_id, quantity in quantities.items()],
+                             unique_fields=['cart', 'product'], increment='quantity')
+            CartService.refresh_totals([cart_id])
+        # The raw upsert skips model signals
+        bump_versions(f'cart:{cart_id}')
+
+    @staticmethod
+    def refresh_for_products(product_ids):
+        """Refresh every cart holding one of the products, e.g. after their prices changed"""
+        CartService.refresh_totals(
+            CartItem.objects.filter(product_id__in=product_ids).values_list('cart_id', flat=True).distinct())
+
+
+class ReservationService:
+    """
+    Holds stock for carts. Every reservation row is mirrored in `Product.reserved_stock`, so available stock
+    is `stock - reserved_stock` without scanning carts. Expired rows keep holding their units until
+    `release_expired` runs; checkout converts whatever the cart still holds.
+    Like checkout, every write locks the product rows before the reservation rows.
+    """
+
+    @staticmethod
+    def expiry():
+        return timezone.now() + timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 60 * 15))
+
+    @staticmethod
+    def invalidate(product_ids):
+        # available_stock is in list payloads too, so the catalog and category scopes go with the product's
+        product_ids = list(product_ids)
+        if product_ids:
+            category_ids = Product.objects.filter(id__in=product_ids).values_list('category_id', flat=True).distinct()
+            invalidate_catalog(product_ids=product_ids, category_ids=list(category_ids))
+
+    @staticmethod
+    def lock_products(product_ids):
+        list(Product.objects.select_for_update().filter(id__in=product_ids).order_by('id').values_list('id', flat=True))
+
+    @staticmethod
+    def reserve(cart_id, product_id, quantity):
+        """Hold `quantity` more units for the cart and restart its timer"""
+        ReservationService.reserve_many(cart_id, {product_id: quantity})
+
+    @staticmethod
+    def reserve_many(cart_id, quantities):
+        """Hold `{product_id: quantity}` more units for the cart, all or nothing, in a fixed number of queries"""
+        with transaction.atomic():
+            products = {row[0]: row[1:] for row in Product.objects.select_for_update().filter(id__in=quantities)
+                        .order_by('id').values_list('id', 'stock', 'reserved_stock', 'name')}
+            for product_id, quantity in quantities.items():
+                if product_id not in products:
+                    raise ValidationError({'product_id': f"Product with {product_id} doesnot exists"})
+                stock, reserved_stock, name = products[product_id]
+                if stock - reserved_stock < quantity:
+                    raise ValidationError({'quantity': f"Not enough stock available for product {name}"})
+
+            Product.objects.filter(id__in=quantities).update(reserved_stock=Case(
+                *[When(id=product_id, then=F('reserved_stock') + quantity) for product_id, quantity in quantities.items()],
+                default=F('reserved_stock'), output_field=Product._meta.get_field('reserved_stock')))
+            expires_at = ReservationService.expiry()
+            upsert_increment(StockReservation, [
+                {'cart': cart_id, 'product': product_id, 'quantity': quantity, 'expires_at': expires_at}
+                for product_id, quantity in quantities.items()
+            ], unique_fields=['cart', 'product'], increment='quantity', replace=['expires_at'])
+        ReservationService.invalidate(quantities)
+
+    @staticmethod
+    def adjust(cart_id, product_id, quantity):
+        """Make the cart hold exactly `quantity` units of the product"""
+        with transaction.atomic():
+            ReservationService.lock_products([product_id])
+            current = StockReservation.objects.filter(
+                cart_id=cart_id, product_id=product_id).values_list('quantity', flat=True).first() or 0
+            if quantity > current:
+                ReservationService.reserve(cart_id, product_id, quantity - current)
+            elif quantity < current:
+                Product.objects.filter(pk=product_id).update(reserved_stock=F('reserved_stock') - (current - quantity))
+                StockReservation.objects.filter(cart_id=cart_id, product_id=product_id).update(
+                    quantity=quantity, expires_at=ReservationService.expiry())
+                ReservationService.invalidate([product_id])
+
+    @staticmethod
+    def release(cart_id, product_id):
+        with transaction.atomic():
+            ReservationService.lock_products([product_id])
+            quantity = StockReservation.objects.filter(
+                cart_id=cart_id, product_id=product_id).values_list('quantity', flat=True).first()
+            if quantity is None:
+                return
+            Product.objects.filter(pk=product_id).update(reserved_stock=F('reserved_stock') - quantity)
+            StockReservation.objects.filter(cart_id=cart_id, product_id=product_id).delete()
+        ReservationService.invalidate([product_id])
+
+    @staticmethod
+    def release_cart(cart_id):
+        """Give back every unit the cart holds, e.g. before the cart or its user is deleted"""
+        with transaction.atomic():
+            product_ids = list(StockReservation.objects.filter(cart_id=cart_id).values_list('product_id', flat=True))
+            if not product_ids:
+                return
+            ReservationService.lock_products(product_ids)
+            held = dict(StockReservation.objects.filter(cart_id=cart_id, product_id__in=product_ids)
+                        .values_list('product_id', 'quantity'))
+            Product.objects.filter(id__in=held).update(reserved_stock=Case(
+                *[When(id=product_id, then=F('reserved_stock') - quantity) for product_id, quantity in held.items()],
+                default=F('reserved_stock'), output_field=Product._meta.get_field('reserved_stock')))
+            StockReservation.objects.filter(cart_id=cart_id, product_id__in=held).delete()
+        ReservationService.invalidate(held)
+
+    @staticmethod
+    def release_expired(batch_size=1000):
+        """Release expired reservations in batches, one UPDATE and one DELETE per batch. Returns the number released"""
+        released, last_id = 0, 0
+        while True:
+            candidates = list(StockReservation.objects.filter(expires_at__lte=timezone.now(), id__gt=last_id)
+                              .order_by('id').values_list('id', 'product_id')[:batch_size])
+            if not candidates:
+                break
+            last_id = candidates[-1][0]
+            with transaction.atomic():
+                ReservationService.lock_products({product_id for _, product_id in candidates})
+                # Re-read under the product locks: checkout or a new add to cart may have taken these meanwhile
+                batch = list(StockReservation.objects.filter(id__in=[row[0] for row in candidates], expires_at__lte=timezone.now())
+                             .values_list('id', 'product_id', 'quantity'))
+                totals = {}
+                for _, product_id, quantity in batch:
+                    totals[product_id] = totals.get(product_id, 0) + quantity
+                if totals:
+                    Product.objects.filter(id__in=totals).update(reserved_stock=Case(
+                        *[When(id=product_id, then=F('reserved_stock') - quantity) for product_id, quantity in totals.items()],
+                        default=F('reserved_stock'), output_field=Product._meta.get_field('reserved_stock')))
+                    StockReservation.objects.filter(id__in=[row[0] for row in batch]).delete()
+            ReservationService.invalidate(totals)
+            released += len(batch)
+        return released
+
+    @staticmethod
+    def rebuild():
+        """Recompute `Product.reserved_stock` from the reservation rows, e.g. after they were edited by hand"""
+        with transaction.atomic():
+            Product.objects.filter(reserved_stock__gt=0).update(reserved_stock=0)
+            totals = StockReservation.objects.order_by().values('product_id').annotate(total=Sum('quantity'))
+            for row in totals:
+                Product.objects.filter(pk=row['product_id']).update(reserved_stock=row['total'])
@@ -0,0 +1,30 @@
+from product.models import Product
+from order.models import Cart, CartItem
+from django.dispatch import receiver
+from api.caching import bump_versions
+from order.services import CartService, ReservationService
+from product.signals import prices_changed
+from django.db.models.signals import post_save, post_delete, pre_delete
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def invalidate_cart(sender, instance, **kwargs):
+    bump_versions(f'cart:{instance.cart_id}')
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+    # The reservations would otherwise go with the cart in a cascade, leaving their units counted as reserved
+    ReservationService.release_cart(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def refresh_cart_totals_on_save(sender, instance, created=False, **kwargs):
+    if not created and instance.price != getattr(instance, '_loaded_price', instance.price):
+        CartService.refresh_for_products([instance.pk])
+
+
+@receiver(prices_changed)
+def refresh_cart_totals(sender, product_ids, **kwargs):
+    if product_ids:
+        CartService.refresh_for_products(product_ids)
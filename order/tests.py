@@ -1,3 +1,603 @@
-from django.test import TestCase
+from io import StringIO
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.utils import timezone
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework.exceptions import ValidationError
+from product.models import Category, Product
+from product.tests import make_seller, make_products
+from users.models import LedgerEntry
+from users.services import LedgerService
+from order.models import (Cart, CartItem, Order, OrderDailyStatusCount, OrderEventCheckpoint, OrderItem,
+                          OrderStatusHistory, StockReservation)
+from order.events import committed_events
+from order.purchases import purchased_product_ids
+from order.services import OrderStatusService, ReservationService, upsert_increment
+from order.cart_backends import CacheCartBackend, get_cart_backend
 
-# Create your tests here.
+User = get_user_model()
+
+
+def make_buyer(email='buyer@example.com', balance=100, address='1 Main St'):
+    buyer = User.objects.create_user(email=email, password='x', address=address)
+    if balance:
+        LedgerService.post(buyer.pk, balance, LedgerEntry.DEPOSIT)
+    return buyer
+
+
+class ShopperTestCase(TestCase):
+    """A seller with two products at 2.00 and 10 in stock, and an authenticated buyer with an open cart"""
+
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.category = Category.objects.create(name='Fruit')
+        self.product, self.other = make_products(self.seller, self.category, count=2)
+        self.buyer = make_buyer()
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.cart_id = self.client.get('/api/v1/cart/').json()['id']
+
+    def add(self, product, quantity=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/v1/cart/{self.cart_id}/items/',
+                                        {'product_id': product.pk, 'quantity': quantity})
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def checkout(self, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/v1/orders/', {'cart_id': self.cart_id}, format='json', headers=headers)
+
+
+class CartConditionalGetTests(ShopperTestCase):
+    def test_unchanged_cart_is_304(self):
+        self.add(self.product)
+        etag = self.client.get('/api/v1/cart/')['ETag']
+        self.assertEqual(self.client.get('/api/v1/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_cart_edit_changes_the_etag(self):
+        self.add(self.product)
+        etag = self.client.get('/api/v1/cart/')['ETag']
+        self.add(self.other)
+        self.assertEqual(self.client.get('/api/v1/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_product_change_changes_the_etag(self):
+        self.add(self.product)
+        etag = self.client.get('/api/v1/cart/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 3
+            self.product.save()
+        response = self.client.get('/api/v1/cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_is_per_user(self):
+        self.add(self.product)
+        etag = self.client.get('/api/v1/cart/')['ETag']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(email='other@example.com', password='x'))
+        other.get('/api/v1/cart/')
+        self.assertEqual(other.get('/api/v1/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CheckoutTests(ShopperTestCase):
+    def test_checkout_moves_stock_balance_and_cart_into_the_order(self):
+        self.add(self.product, 3)
+        self.add(self.other, 1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.total_price, 8)
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 2)
+        self.assertEqual(dict(Product.objects.values_list('id', 'stock')), {self.product.pk: 7, self.other.pk: 9})
+        self.assertEqual(Product.objects.filter(reserved_stock__gt=0).count(), 0)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.balance, 92)
+        self.assertFalse(CartItem.objects.filter(cart_id=self.cart_id).exists())
+        self.assertEqual(Cart.objects.values_list('item_count', 'subtotal').get(pk=self.cart_id), (0, 0))
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.add(self.product, 3)
+        self.add(self.other, 1)
+        # The cart's hold lapses and the last units sell elsewhere before it checks out
+        StockReservation.objects.update(expires_at=timezone.now())
+        ReservationService.release_expired()
+        Product.objects.filter(pk=self.other.pk).update(stock=0)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Not enough stock', str(response.json()))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart_id=self.cart_id).count(), 2)
+
+    def test_insufficient_balance_changes_nothing(self):
+        self.add(self.product, 10)
+        LedgerService.post(self.buyer.pk, -90, LedgerEntry.ADJUSTMENT)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Insufficient balance', str(response.json()))
+        self.assertEqual(Product.objects.values_list('stock', 'reserved_stock').get(pk=self.product.pk), (10, 10))
+        self.assertFalse(Order.objects.exists())
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.balance, 10)
+
+    def test_address_is_required(self):
+        self.add(self.product)
+        User.objects.filter(pk=self.buyer.pk).update(address='')
+        self.assertEqual(self.checkout().status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart_is_rejected(self):
+        self.assertEqual(self.checkout().status_code, 400)
+
+
+class ReservationTests(ShopperTestCase):
+    def held(self, product):
+        return Product.objects.values_list('reserved_stock', flat=True).get(pk=product.pk)
+
+    def test_cart_edits_hold_and_give_back_stock(self):
+        item_id = self.add(self.product, 3).json()['id']
+        self.assertEqual(self.held(self.product), 3)
+        url = f'/api/v1/cart/{self.cart_id}/items/{item_id}/'
+        self.assertEqual(self.client.patch(url, {'quantity': 5}).status_code, 200)
+        self.assertEqual(self.held(self.product), 5)
+        self.assertEqual(self.client.patch(url, {'quantity': 2}).status_code, 200)
+        self.assertEqual(self.held(self.product), 2)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.held(self.product), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_held_units_are_unavailable_to_other_carts(self):
+        self.add(self.product, 8)
+        other = APIClient()
+        other.force_authenticate(make_buyer('other@example.com'))
+        cart_id = other.get('/api/v1/cart/').json()['id']
+        response = other.post(f'/api/v1/cart/{cart_id}/items/', {'product_id': self.product.pk, 'quantity': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(APIClient().get(f'/api/v1/products/{self.product.pk}/').json()['available_stock'], 2)
+
+    def test_expired_reservations_are_released(self):
+        self.add(self.product, 3)
+        self.add(self.other, 2)
+        StockReservation.objects.filter(product=self.product).update(expires_at=timezone.now())
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn('Released 1', out.getvalue())
+        self.assertEqual((self.held(self.product), self.held(self.other)), (0, 2))
+        # The lines stay in the cart; checkout takes them from free stock
+        self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(Product.objects.values_list('stock', 'reserved_stock').get(pk=self.product.pk), (7, 0))
+
+    def test_deleting_the_cart_releases_its_units(self):
+        self.add(self.product, 3)
+        Cart.objects.get(pk=self.cart_id).delete()
+        self.assertEqual(self.held(self.product), 0)
+
+    def test_stale_product_save_keeps_reserved_stock(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add(self.product, 3)
+        stale.name = 'renamed'
+        stale.save()
+        self.assertEqual(self.held(self.product), 3)
+
+    def test_rebuild_recomputes_reserved_stock(self):
+        self.add(self.product, 3)
+        Product.objects.update(reserved_stock=7)
+        call_command('release_expired_reservations', rebuild=True, stdout=StringIO())
+        self.assertEqual((self.held(self.product), self.held(self.other)), (3, 0))
+
+    def test_reservations_invalidate_cached_listings(self):
+        url = f'/api/v1/products/?category_id={self.category.pk}'
+        APIClient().get(url)
+        self.add(self.product, 4)
+        response = APIClient().get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        stock = {item['id']: item['available_stock'] for item in response.json()['results']}
+        self.assertEqual(stock[self.product.pk], 6)
+
+
+class CartTotalsTests(ShopperTestCase):
+    def summary(self):
+        response = self.client.get('/api/v1/cart/summary/').json()
+        return response['item_count'], float(response['subtotal'])
+
+    def test_cart_read_query_count_does_not_grow_with_items(self):
+        self.add(self.product)
+        with CaptureQueriesContext(connection) as one_item:
+            self.client.get('/api/v1/cart/')
+        self.add(self.other)
+        make_products(self.seller, self.category, count=1)
+        with CaptureQueriesContext(connection) as two_items:
+            response = self.client.get('/api/v1/cart/')
+        self.assertEqual(len(response.json()['items']), 2)
+        self.assertEqual(len(one_item), len(two_items))
+        self.assertFalse([query for query in two_items if not query['sql'].startswith('SELECT')])
+
+    def test_totals_follow_item_changes(self):
+        item_id = self.add(self.product, 2).json()['id']
+        self.add(self.other, 1)
+        self.assertEqual(self.summary(), (3, 6))
+        self.client.patch(f'/api/v1/cart/{self.cart_id}/items/{item_id}/', {'quantity': 4})
+        self.assertEqual(self.summary(), (5, 10))
+        self.client.delete(f'/api/v1/cart/{self.cart_id}/items/{item_id}/')
+        self.assertEqual(self.summary(), (1, 2))
+        self.assertEqual(float(self.client.get('/api/v1/cart/').json()['total_price']), 2)
+
+    def test_price_changes_refresh_totals(self):
+        self.add(self.product, 2)
+        self.product.refresh_from_db()
+        self.product.price = 3
+        self.product.save()
+        self.assertEqual(self.summary(), (2, 6))
+        seller = APIClient()
+        seller.force_authenticate(self.seller)
+        seller.patch('/api/v1/products/inventory/', {'items': [{'id': self.product.pk, 'price': '1.50'}]}, format='json')
+        self.assertEqual(self.summary(), (2, 3))
+
+    def test_summary_without_a_cart(self):
+        client = APIClient()
+        client.force_authenticate(make_buyer('other@example.com'))
+        self.assertEqual(client.get('/api/v1/cart/summary/').json(), {'id': None, 'item_count': 0, 'subtotal': 0})
+
+
+class CartUpsertTests(ShopperTestCase):
+    def add_batch(self, *items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/v1/cart/{self.cart_id}/items/batch/',
+                                    {'items': [{'product_id': product_id, 'quantity': quantity}
+                                               for product_id, quantity in items]}, format='json')
+
+    def lines(self):
+        return dict(CartItem.objects.filter(cart_id=self.cart_id).values_list('product_id', 'quantity'))
+
+    def test_adding_a_product_again_sums_quantities(self):
+        first = self.add(self.product, 2).json()
+        second = self.add(self.product, 3).json()
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(second['quantity'], 5)
+        self.assertEqual(self.lines(), {self.product.pk: 5})
+        self.assertEqual(StockReservation.objects.get().quantity, 5)
+
+    def test_upsert_increment_adds_and_replaces(self):
+        later = timezone.now() + timedelta(hours=1)
+        rows = [{'cart': self.cart_id, 'product': self.product.pk, 'quantity': 2, 'expires_at': timezone.now()}]
+        upsert_increment(StockReservation, rows, unique_fields=['cart', 'product'], increment='quantity')
+        rows = [{'cart': self.cart_id, 'product': self.product.pk, 'quantity': 3, 'expires_at': later},
+                {'cart': self.cart_id, 'product': self.other.pk, 'quantity': 1, 'expires_at': later}]
+        upsert_increment(StockReservation, rows, unique_fields=['cart', 'product'], increment='quantity',
+                         replace=['expires_at'])
+        held = {row.product_id: row for row in StockReservation.objects.all()}
+        self.assertEqual((held[self.product.pk].quantity, held[self.other.pk].quantity), (5, 1))
+        self.assertEqual(held[self.product.pk].expires_at, later)
+
+    def test_batch_adds_every_line(self):
+        response = self.add_batch((self.product.pk, 1), (self.other.pk, 2), (self.product.pk, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['items']), 2)
+        self.assertEqual(self.lines(), {self.product.pk: 3, self.other.pk: 2})
+        self.assertEqual(Cart.objects.values_list('item_count', 'subtotal').get(pk=self.cart_id), (5, 10))
+
+    def test_batch_query_count_does_not_grow_with_lines(self):
+        extra = make_products(self.seller, self.category, count=4)
+        with CaptureQueriesContext(connection) as two_lines:
+            self.add_batch((self.product.pk, 1), (self.other.pk, 1))
+        with CaptureQueriesContext(connection) as four_lines:
+            self.add_batch(*[(product.pk, 1) for product in extra])
+        self.assertEqual(len(two_lines), len(four_lines))
+
+    def test_batch_is_all_or_nothing(self):
+        self.assertEqual(self.add_batch((self.product.pk, 1), (999999, 1)).status_code, 400)
+        self.assertEqual(self.add_batch((self.product.pk, 1), (self.other.pk, 11)).status_code, 400)
+        self.assertEqual(self.lines(), {})
+        self.assertFalse(Product.objects.filter(reserved_stock__gt=0).exists())
+        self.assertEqual(self.add_batch().status_code, 400)
+
+
+@override_settings(CART_BACKEND='order.cart_backends.CacheCartBackend')
+class CacheCartBackendTests(ShopperTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = get_cart_backend()
+
+    def test_edits_stay_in_the_cache_until_flushed(self):
+        self.add(self.product, 2)
+        self.add(self.other, 1)
+        self.client.patch(f'/api/v1/cart/{self.cart_id}/items/{self.other.pk}/', {'quantity': 3})
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.other.pk).reserved_stock, 3)
+        cart = self.client.get('/api/v1/cart/').json()
+        self.assertEqual({item['product']['id']: item['quantity'] for item in cart['items']},
+                         {self.product.pk: 2, self.other.pk: 3})
+        self.assertEqual(self.client.get('/api/v1/cart/summary/').json()['item_count'], 5)
+
+        self.assertEqual([str(cart_id) for cart_id in self.backend.dirty_carts()], [self.cart_id])
+        out = StringIO()
+        call_command('flush_carts', stdout=out)
+        self.assertIn('Flushed 1', out.getvalue())
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')), {self.product.pk: 2, self.other.pk: 3})
+        self.assertEqual(Cart.objects.get(pk=self.cart_id).item_count, 5)
+        self.assertEqual(self.backend.dirty_carts(), [])
+
+    def test_evicted_cart_reloads_from_its_last_flush(self):
+        self.add(self.product, 2)
+        self.backend.flush(self.cart_id)
+        self.add(self.other, 1)
+        cache.delete(CacheCartBackend.ITEMS_KEY.format(cart_id=self.cart_id))
+        self.assertEqual(self.backend.read(self.cart_id), {self.product.pk: 2})
+
+    def test_checkout_writes_through_and_clears_the_cart(self):
+        self.add(self.product, 2)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+        self.assertEqual(self.backend.read(self.cart_id), {})
+        self.assertFalse(CartItem.objects.exists())
+        # The cart's lock was released with the commit
+        with self.backend.locked(self.cart_id, wait=0):
+            pass
+
+    def test_concurrent_edit_waits_for_the_lock(self):
+        with self.backend.locked(self.cart_id):
+            with self.assertRaises(ValidationError):
+                with self.backend.locked(self.cart_id, wait=0):
+                    pass
+
+
+class PlacedOrderTestCase(ShopperTestCase):
+    """The buyer has checked out 2 of the seller's product and 1 of a second seller's"""
+
+    def setUp(self):
+        super().setUp()
+        self.second_seller = make_seller('second@example.com')
+        self.foreign = make_products(self.second_seller, self.category, count=1)[0]
+        self.add(self.product, 2)
+        self.add(self.foreign, 1)
+        self.order = Order.objects.get(pk=self.checkout().json()['id'])
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class SellerItemsTests(PlacedOrderTestCase):
+    def test_items_carry_their_seller(self):
+        self.assertEqual(dict(OrderItem.objects.values_list('product_id', 'seller_id')),
+                         {self.product.pk: self.seller.pk, self.foreign.pk: self.second_seller.pk})
+
+    def test_feed_lists_only_the_sellers_lines(self):
+        response = self.client_for(self.seller).get('/api/v1/orders/seller-items/')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(item['product_name'], item['quantity']) for item in results], [('banana 0', 2)])
+        self.assertEqual(results[0]['order_id'], str(self.order.pk))
+
+    def test_seller_order_list_is_limited_to_their_items(self):
+        orders = self.client_for(self.second_seller).get('/api/v1/orders/').json()['results']
+        self.assertEqual([item['product']['id'] for item in orders[0]['items']], [self.foreign.pk])
+
+    def test_staff_may_pick_the_seller(self):
+        staff = self.client_for(User.objects.create_superuser(email='admin@example.com', password='x'))
+        results = staff.get('/api/v1/orders/seller-items/', {'seller_id': self.second_seller.pk}).json()['results']
+        self.assertEqual([item['product_id'] for item in results], [self.foreign.pk])
+        self.assertEqual(staff.get('/api/v1/orders/seller-items/', {'seller_id': 'abc'}).status_code, 400)
+
+    def test_buyers_have_no_feed(self):
+        self.assertEqual(self.client.get('/api/v1/orders/seller-items/').status_code, 403)
+
+
+class SellerOrderTests(PlacedOrderTestCase):
+    def test_checkout_splits_the_order_by_seller(self):
+        split = {seller_order.seller_id: seller_order for seller_order in self.order.seller_orders.all()}
+        self.assertEqual(set(split), {self.seller.pk, self.second_seller.pk})
+        self.assertEqual((split[self.seller.pk].total_price, split[self.seller.pk].item_count), (4, 1))
+        self.assertEqual((split[self.second_seller.pk].total_price, split[self.second_seller.pk].item_count), (2, 1))
+        for item in OrderItem.objects.all():
+            self.assertEqual(item.seller_order.seller_id, item.seller_id)
+        self.assertEqual(sum(seller_order.total_price for seller_order in split.values()), self.order.total_price)
+
+    def test_sellers_see_only_their_sub_orders(self):
+        response = self.client_for(self.second_seller).get('/api/v1/seller-orders/')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(result['seller'], len(result['items'])) for result in results], [(self.second_seller.pk, 1)])
+        self.assertEqual(self.client.get('/api/v1/seller-orders/').status_code, 403)
+
+    def test_seller_updates_only_their_part(self):
+        mine = self.order.seller_orders.get(seller=self.seller)
+        theirs = self.order.seller_orders.get(seller=self.second_seller)
+        seller = self.client_for(self.seller)
+        self.assertEqual(seller.patch(f'/api/v1/seller-orders/{mine.pk}/update_status/',
+                                      {'status': Order.SHIPPED}).status_code, 200)
+        self.assertEqual(seller.patch(f'/api/v1/seller-orders/{theirs.pk}/update_status/',
+                                      {'status': Order.SHIPPED}).status_code, 404)
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.status, Order.PENDING)
+        self.assertEqual([result['id'] for result in seller.get('/api/v1/seller-orders/', {'status': Order.SHIPPED}).json()['results']],
+                         [mine.pk])
+
+    def test_staff_filters(self):
+        staff = self.client_for(User.objects.create_superuser(email='admin@example.com', password='x'))
+        self.assertEqual(len(staff.get('/api/v1/seller-orders/').json()['results']), 2)
+        results = staff.get('/api/v1/seller-orders/', {'seller_id': self.seller.pk}).json()['results']
+        self.assertEqual([result['seller'] for result in results], [self.seller.pk])
+        self.assertEqual(staff.get('/api/v1/seller-orders/', {'seller_id': 'abc'}).status_code, 400)
+
+
+class OrderStatusTests(PlacedOrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = self.client_for(User.objects.create_superuser(email='admin@example.com', password='x'))
+
+    def bulk(self, ids, status, client=None, url='/api/v1/orders/bulk-status/'):
+        return (client or self.staff).post(url, {'ids': [str(pk) for pk in ids], 'status': status}, format='json')
+
+    def test_bulk_transition_reports_each_id(self):
+        delivered = Order.objects.create(user=self.buyer, total_price=1, status=Order.DELIVERED)
+        missing = '00000000-0000-0000-0000-000000000000'
+        response = self.bulk([self.order.pk, delivered.pk, missing], Order.SHIPPED)
+        self.assertEqual(response.status_code, 200)
+        results = {result['id']: result['result'] for result in response.json()['results']}
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(set(results.values()), {'updated', 'invalid_transition', 'not_found'})
+        self.assertEqual(self.bulk([self.order.pk], Order.SHIPPED).json()['results'][0]['result'], 'unchanged')
+
+    def test_order_transition_cascades_to_its_seller_orders(self):
+        self.bulk([self.order.pk], Order.SHIPPED)
+        self.assertEqual(set(self.order.seller_orders.values_list('status', flat=True)), {Order.SHIPPED})
+        history = OrderStatusHistory.objects.filter(order=self.order, from_status=Order.PENDING)
+        self.assertEqual(history.count(), 3)
+        self.assertEqual(set(history.values_list('to_status', flat=True)), {Order.SHIPPED})
+
+    def test_finished_seller_orders_keep_their_status(self):
+        mine = self.order.seller_orders.get(seller=self.seller)
+        OrderStatusService.transition_seller_orders([mine.pk], Order.DELIVERED)
+        self.bulk([self.order.pk], Order.CANCELED)
+        mine.refresh_from_db()
+        self.assertEqual(mine.status, Order.DELIVERED)
+
+    def test_order_follows_its_least_advanced_seller_order(self):
+        mine, theirs = self.order.seller_orders.get(seller=self.seller), self.order.seller_orders.get(seller=self.second_seller)
+        seller = self.client_for(self.seller)
+        response = self.bulk([mine.pk], Order.DELIVERED, client=seller, url='/api/v1/seller-orders/bulk-status/')
+        self.assertEqual(response.json()['updated'], 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.PENDING)
+        OrderStatusService.transition_seller_orders([theirs.pk], Order.SHIPPED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.SHIPPED)
+        OrderStatusService.transition_seller_orders([theirs.pk], Order.CANCELED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.DELIVERED)
+
+    def test_sellers_can_not_move_other_sellers_orders(self):
+        theirs = self.order.seller_orders.get(seller=self.second_seller)
+        response = self.bulk([theirs.pk], Order.SHIPPED, client=self.client_for(self.seller),
+                             url='/api/v1/seller-orders/bulk-status/')
+        self.assertEqual(response.json()['results'][0]['result'], 'not_found')
+        self.assertEqual(self.bulk([self.order.pk], Order.SHIPPED, client=self.client_for(self.seller)).status_code, 403)
+
+    def test_history_is_append_only(self):
+        event = OrderStatusHistory.objects.filter(order=self.order).first()
+        event.to_status = Order.DELIVERED
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_delivered_orders_can_not_be_canceled(self):
+        self.bulk([self.order.pk], Order.DELIVERED)
+        self.assertEqual(self.client.post(f'/api/v1/orders/{self.order.pk}/cancel/').status_code, 400)
+
+
+class OrderEventTests(PlacedOrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = self.client_for(User.objects.create_superuser(email='admin@example.com', password='x'))
+
+    def test_checkout_and_rollup_write_events(self):
+        created = OrderStatusHistory.objects.filter(order=self.order)
+        self.assertEqual(created.count(), 3)
+        self.assertEqual(set(created.values_list('from_status', 'to_status')), {('', Order.PENDING)})
+        for seller_order in self.order.seller_orders.all():
+            OrderStatusService.transition_seller_orders([seller_order.pk], Order.SHIPPED)
+        rolled = OrderStatusHistory.objects.filter(order=self.order, seller_order=None).order_by('pk').last()
+        self.assertEqual((rolled.from_status, rolled.to_status), (Order.PENDING, Order.SHIPPED))
+
+    def test_recent_events_wait_out_the_safety_lag(self):
+        with override_settings(ORDER_EVENT_SAFETY_LAG=30):
+            self.assertEqual(committed_events(), [])
+        OrderStatusHistory.objects.update(changed_at=timezone.now() - timedelta(minutes=1))
+        with override_settings(ORDER_EVENT_SAFETY_LAG=30):
+            self.assertEqual(len(committed_events()), 3)
+
+    @override_settings(ORDER_EVENT_SAFETY_LAG=0)
+    def test_daily_counts_apply_each_event_once(self):
+        out = StringIO()
+        call_command('process_order_events', batch_size=2, stdout=out)
+        self.assertIn('processed 3 events', out.getvalue())
+        OrderStatusService.transition_orders([self.order.pk], Order.SHIPPED)
+        call_command('process_order_events', stdout=StringIO())
+        call_command('process_order_events', stdout=StringIO())
+        counts = dict(OrderDailyStatusCount.objects.values_list('status', 'count'))
+        self.assertEqual(counts, {Order.PENDING: 1, Order.SHIPPED: 1})
+        self.assertEqual(OrderEventCheckpoint.objects.get(name='daily_status_counts').last_event_id,
+                         OrderStatusHistory.objects.order_by('pk').last().pk)
+
+    @override_settings(ORDER_EVENT_SAFETY_LAG=0)
+    def test_feed_pages_by_event_id(self):
+        first = self.staff.get('/api/v1/order-events/', {'limit': 2}).json()
+        self.assertEqual(len(first['results']), 2)
+        rest = self.staff.get('/api/v1/order-events/', {'after': first['next_after']}).json()
+        self.assertEqual(len(rest['results']), 1)
+        self.assertEqual(self.staff.get('/api/v1/order-events/', {'after': rest['next_after']}).json()['results'], [])
+        self.assertEqual(self.staff.get('/api/v1/order-events/', {'after': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/order-events/').status_code, 403)
+
+
+class HasOrderedTests(PlacedOrderTestCase):
+    def test_batch_lookup_keeps_request_order(self):
+        response = self.client.get('/api/v1/orders/has-ordered/',
+                                   {'product_ids': f'{self.foreign.pk},{self.other.pk},{self.product.pk},{self.foreign.pk}'})
+        self.assertEqual(response.json()['product_ids'], [self.foreign.pk, self.product.pk])
+        self.assertEqual(self.client.get(f'/api/v1/orders/has-ordered/{self.other.pk}/').json(), {'hasOrdered': False})
+        self.assertEqual(self.client.get(f'/api/v1/orders/has-ordered/{self.product.pk}/').json(), {'hasOrdered': True})
+
+    def test_invalid_batches(self):
+        self.assertEqual(self.client.get('/api/v1/orders/has-ordered/', {'product_ids': '1,x'}).status_code, 400)
+        too_many = ','.join(str(pk) for pk in range(1, 102))
+        self.assertEqual(self.client.get('/api/v1/orders/has-ordered/', {'product_ids': too_many}).status_code, 400)
+
+    def test_set_is_cached_until_the_next_order(self):
+        purchased_product_ids(self.buyer.pk)
+        with self.assertNumQueries(0):
+            self.assertIn(self.product.pk, purchased_product_ids(self.buyer.pk))
+        self.add(self.other)
+        self.checkout()
+        self.assertIn(self.other.pk, purchased_product_ids(self.buyer.pk))
+
+    def test_product_reads_can_include_it(self):
+        response = self.client.get('/api/v1/products/', {'include': 'has_ordered'})
+        flags = {item['id']: item['has_ordered'] for item in response.json()['results']}
+        self.assertEqual(flags, {self.product.pk: True, self.other.pk: False, self.foreign.pk: True})
+        detail = self.client.get(f'/api/v1/products/{self.other.pk}/', {'include': 'has_ordered'}).json()
+        self.assertFalse(detail['has_ordered'])
+        self.assertNotIn('has_ordered', self.client.get(f'/api/v1/products/{self.other.pk}/').json())
+
+
+class WishlistTests(ShopperTestCase):
+    def bulk(self, action, product_ids, client=None):
+        return (client or self.client).post(f'/api/v1/Wishlist/{action}/', {'product_ids': product_ids}, format='json')
+
+    def test_bulk_add_skips_saved_and_unknown_products(self):
+        self.client.post('/api/v1/Wishlist/', {'product_id': self.product.pk})
+        response = self.bulk('bulk', [self.other.pk, self.product.pk, 999999, self.other.pk])
+        self.assertEqual(response.json(), {'product_ids': [self.other.pk, self.product.pk], 'not_found': [999999]})
+        self.assertEqual(sorted(self.client.get('/api/v1/Wishlist/ids/').json()['product_ids']),
+                         sorted([self.product.pk, self.other.pk]))
+
+    def test_bulk_remove_only_touches_the_users_entries(self):
+        self.bulk('bulk', [self.product.pk, self.other.pk])
+        other = APIClient()
+        other.force_authenticate(make_buyer('other@example.com'))
+        self.bulk('bulk', [self.product.pk], client=other)
+        self.assertEqual(self.bulk('bulk-remove', [self.product.pk]).json(), {'removed': 1})
+        self.assertEqual(self.client.get('/api/v1/Wishlist/ids/').json()['product_ids'], [self.other.pk])
+        self.assertEqual(other.get('/api/v1/Wishlist/ids/').json()['product_ids'], [self.product.pk])
+        self.assertEqual(self.bulk('bulk-remove', []).status_code, 400)
+
+    def test_list_is_lean_and_fixed_cost(self):
+        self.bulk('bulk', [self.product.pk])
+        with CaptureQueriesContext(connection) as one:
+            self.client.get('/api/v1/Wishlist/')
+        self.bulk('bulk', [product.pk for product in make_products(self.seller, self.category, count=4)])
+        with CaptureQueriesContext(connection) as five:
+            response = self.client.get('/api/v1/Wishlist/')
+        self.assertEqual(len(one), len(five))
+        item = response.json()['results'][0]['product']
+        self.assertNotIn('reviews', item)
+        self.assertEqual(item['seller_name'], 'Sel Ler')
@@ -1,32 +1,78 @@
+from api.roles import is_seller
 from django.db.models import Prefetch
-from order.services import OrderService
+from api.caching import conditional_get
+from api.idempotency import idempotent
+from api.authentication import StatelessJWTAuthentication
+from order.services import OrderService, OrderStatusService
+from order.cart_backends import get_cart_backend
+from order.events import committed_events
+from order.purchases import purchased_product_ids
+from django.http import Http404
 from order import serializers as orderSz
 from rest_framework.views import APIView
-from api.permissions import IsSellerOrAdmin
+from api.permissions import IsSellerOrAdmin, IsSellerOrStaff
+from product.paginations import KeysetPagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.viewsets import GenericViewSet
-from rest_framework.mixins import RetrieveModelMixin
-from rest_framework.permissions import IsAuthenticated
-from order.models import Wishlist, Cart, CartItem, Order, OrderItem
-from order.endpoints import OrderEndpoints, CartEndpoints, WishlistEndpoints
-from order.serializers import WishlistSerializer, CartSerializer, CartItemSerializer,AddCartItemSerializer, UpdateCartItemSerializer, EmptySerializer
+from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from order.models import Wishlist, Cart, CartItem, Order, OrderItem, SellerOrder
+from product.models import Product
+from order.endpoints import OrderEndpoints, OrderEventEndpoints, SellerOrderEndpoints, CartEndpoints, WishlistEndpoints
+from order.serializers import WishlistSerializer, WishlistBulkSerializer, CartSerializer, CartItemSerializer,AddCartItemSerializer, AddCartItemsSerializer, UpdateCartItemSerializer, EmptySerializer
 
 
 
 class WishlistViewSet(ModelViewSet):
     serializer_class = WishlistSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return Wishlist.objects.none()
-        return Wishlist.objects.filter(user=self.request.user).order_by('-added_at')
+        return (Wishlist.objects.filter(user_id=self.request.user.pk).order_by('-added_at')
+                .prefetch_related(Prefetch('product', queryset=Product.objects.for_list())))
+
+    def get_serializer_class(self):
+        if self.action in ['bulk_add', 'bulk_remove']:
+            return WishlistBulkSerializer
+        return WishlistSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @WishlistEndpoints.ids
+    @action(detail=False, methods=['get'])
+    def ids(self, request):
+        product_ids = Wishlist.objects.filter(user_id=request.user.pk).values_list('product_id', flat=True)
+        return Response({'product_ids': list(product_ids)})
+
+    @WishlistEndpoints.bulk_add
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_add(self, request):
+        serializer = WishlistBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = list(dict.fromkeys(serializer.validated_data['product_ids']))
+        found = set(Product.objects.filter(id__in=requested).values_list('id', flat=True))
+        # Products already saved hit unique_together and are skipped by the database
+        Wishlist.objects.bulk_create([Wishlist(user_id=request.user.pk, product_id=product_id)
+                                      for product_id in requested if product_id in found], ignore_conflicts=True)
+        return Response({'product_ids': [product_id for product_id in requested if product_id in found],
+                         'not_found': [product_id for product_id in requested if product_id not in found]})
+
+    @WishlistEndpoints.bulk_remove
+    @action(detail=False, methods=['post'], url_path='bulk-remove')
+    def bulk_remove(self, request):
+        serializer = WishlistBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        removed, _ = Wishlist.objects.filter(user_id=request.user.pk, product_id__in=serializer.validated_data['product_ids']).delete()
+        return Response({'removed': removed})
+
     @WishlistEndpoints.list
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
@@ -52,27 +98,42 @@ class WishlistViewSet(ModelViewSet):
 class CartViewSet(RetrieveModelMixin, GenericViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+        # Reads stay read-only; the cart row is only written the first time a user opens it
+        return get_cart_backend().get_cart(self.request.user.pk)
     
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Cart.objects.none()
-        return Cart.objects.prefetch_related('items__product').filter(user=self.request.user)
+        return Cart.objects.filter(user_id=self.request.user.pk)
+
+    def get_cache_scopes(self):
+        return get_cart_backend().cache_scopes(self.request.user.pk)
     
     
     @CartEndpoints.list
+    @conditional_get
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
+    @CartEndpoints.summary
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        summary = get_cart_backend().summary(request.user.pk)
+        if summary is None:
+            return Response({'id': None, 'item_count': 0, 'subtotal': 0})
+        return Response(orderSz.CartSummarySerializer(summary).data)
+
 
 
 class CartItemViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_serializer_class(self):
+        if self.action == 'add_batch':
+            return AddCartItemsSerializer
         if self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
@@ -88,11 +149,21 @@ class CartItemViewSet(ModelViewSet):
 
     def get_queryset(self):
         return CartItem.objects.select_related('product').filter(cart_id=self.kwargs.get('cart_pk'))
+
+    def get_object(self):
+        line = get_cart_backend().get_line(self.kwargs.get('cart_pk'), self.kwargs.get('pk'))
+        if line is None:
+            raise Http404
+        return line
+
+    def perform_destroy(self, instance):
+        get_cart_backend().remove(instance)
     
 
     @CartEndpoints.list_items
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        lines = get_cart_backend().lines(self.kwargs.get('cart_pk'))
+        return Response(self.get_serializer(lines, many=True).data)
 
     @CartEndpoints.retrieve_item
     def retrieve(self, request, *args, **kwargs):
@@ -102,6 +173,11 @@ class CartItemViewSet(ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    @CartEndpoints.add_batch
+    @action(detail=False, methods=['post'], url_path='batch')
+    def add_batch(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     @CartEndpoints.update
     def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
@@ -115,17 +191,20 @@ class CartItemViewSet(ModelViewSet):
 
 class OrderViewset(ModelViewSet):
     http_method_names = ['get', 'post', 'delete', 'patch', 'head', 'options']
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Order.objects.none()
         if self.request.user.is_staff:
-            return Order.objects.prefetch_related('items__product').all()
-        if self.request.user.groups.filter(name="seller").exists():
-            seller_items = OrderItem.objects.filter(product__seller=self.request.user)
-            return (Order.objects.filter(items__product__seller=self.request.user)
-                .prefetch_related(Prefetch('items', queryset=seller_items.prefetch_related('product'))).distinct())
-        return Order.objects.prefetch_related('items__product').filter(user=self.request.user)
+            return Order.objects.prefetch_related('items__product', 'seller_orders').all()
+        if is_seller(self.request.user):
+            seller_items = OrderItem.objects.filter(seller_id=self.request.user.pk)
+            seller_orders = SellerOrder.objects.filter(seller_id=self.request.user.pk)
+            return (Order.objects.filter(id__in=seller_orders.values('order_id'))
+                .prefetch_related(Prefetch('items', queryset=seller_items.prefetch_related('product__images')),
+                                  Prefetch('seller_orders', queryset=seller_orders)))
+        return Order.objects.prefetch_related('items__product', 'seller_orders').filter(user=self.request.user)
     
     def get_serializer_context(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -139,17 +218,58 @@ class OrderViewset(ModelViewSet):
         OrderService.cancel_order(order=order, user=request.user)
         return Response({'status': 'Order canceled'})
 
+    @OrderEndpoints.seller_items
+    @action(detail=False, methods=['get'], url_path='seller-items')
+    def seller_items(self, request):
+        if not (request.user.is_staff or is_seller(request.user)):
+            raise PermissionDenied("Only sellers have an order feed.")
+        seller_id = request.user.pk
+        if request.user.is_staff and request.query_params.get('seller_id'):
+            try:
+                seller_id = int(request.query_params['seller_id'])
+            except ValueError:
+                raise ValidationError({'seller_id': "Must be a user id"})
+        items = (OrderItem.objects.filter(seller_id=seller_id)
+                 .select_related('product').only('id', 'order_id', 'product_id', 'product__name', 'quantity',
+                                                 'price', 'total_price', 'created_at'))
+        page = self.paginate_queryset(items)
+        return self.get_paginated_response(orderSz.SellerOrderItemSerializer(page, many=True).data)
+
+    @OrderEndpoints.has_ordered
+    @action(detail=False, methods=['get'], url_path='has-ordered')
+    def has_ordered(self, request):
+        try:
+            product_ids = [int(product_id) for product_id in request.query_params.get('product_ids', '').split(',') if product_id]
+        except ValueError:
+            raise ValidationError({'product_ids': "Must be a comma separated list of product ids"})
+        if len(product_ids) > 100:
+            raise ValidationError({'product_ids': "At most 100 product ids per request"})
+        purchased = purchased_product_ids(request.user.pk)
+        return Response({'product_ids': [product_id for product_id in dict.fromkeys(product_ids) if product_id in purchased]})
+
     @OrderEndpoints.update_status
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         order = self.get_object()
         serializer = orderSz.UpdateOrderSerializer(
-            order, data=request.data, partial=True)
+            order, data=request.data, partial=True, context=self.get_serializer_context())
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response({'status': f'Order status updated to {request.data['status']}'})
 
+    @OrderEndpoints.bulk_status
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        serializer = orderSz.BulkOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = OrderStatusService.transition_orders(
+            serializer.validated_data['ids'], serializer.validated_data['status'], request.user)
+        return Response({'updated': sum(result['result'] == OrderStatusService.UPDATED for result in results),
+                         'results': results})
+
     def get_permissions(self):
+        if self.action == 'bulk_status':
+            return [IsAdminUser()]
         if self.action in ['update_status', 'destroy']:
             return [IsSellerOrAdmin()]
         return [IsAuthenticated()]
@@ -159,6 +279,10 @@ class OrderViewset(ModelViewSet):
             return orderSz.EmptySerializer
         if self.action == 'create':
             return orderSz.CreateOrderSerializer
+        if self.action == 'seller_items':
+            return orderSz.SellerOrderItemSerializer
+        if self.action == 'bulk_status':
+            return orderSz.BulkOrderStatusSerializer
         elif self.action == 'update_status':
             return orderSz.UpdateOrderSerializer
         return orderSz.OrderSerializer
@@ -174,6 +298,7 @@ class OrderViewset(ModelViewSet):
         return super().retrieve(request, *args, **kwargs)
 
     @OrderEndpoints.create
+    @idempotent('orders.create')
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
     
@@ -183,11 +308,86 @@ class OrderViewset(ModelViewSet):
 
 
 
+class SellerOrderViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
+    """A seller's fulfilment queue: their share of each order, with its own status"""
+    http_method_names = ['get', 'post', 'patch', 'head', 'options']
+    permission_classes = [IsSellerOrStaff]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return SellerOrder.objects.none()
+        seller_orders = SellerOrder.objects.prefetch_related('items__product__images')
+        if not self.request.user.is_staff:
+            seller_orders = seller_orders.filter(seller_id=self.request.user.pk)
+        elif self.request.query_params.get('seller_id'):
+            try:
+                seller_orders = seller_orders.filter(seller_id=int(self.request.query_params['seller_id']))
+            except ValueError:
+                raise ValidationError({'seller_id': "Must be a user id"})
+        if self.request.query_params.get('status'):
+            seller_orders = seller_orders.filter(status=self.request.query_params['status'])
+        return seller_orders
+
+    def get_serializer_class(self):
+        if self.action == 'update_status':
+            return orderSz.UpdateSellerOrderSerializer
+        if self.action == 'bulk_status':
+            return orderSz.BulkSellerOrderStatusSerializer
+        return orderSz.SellerOrderSerializer
+
+    @SellerOrderEndpoints.list
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @SellerOrderEndpoints.retrieve
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @SellerOrderEndpoints.update_status
+    @action(detail=True, methods=['patch'])
+    def update_status(self, request, pk=None):
+        serializer = orderSz.UpdateSellerOrderSerializer(self.get_object(), data=request.data, context={'user': request.user})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({'status': f"Order status updated to {serializer.validated_data['status']}"})
+
+    @SellerOrderEndpoints.bulk_status
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        serializer = orderSz.BulkSellerOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = OrderStatusService.transition_seller_orders(
+            serializer.validated_data['ids'], serializer.validated_data['status'], request.user,
+            seller_id=None if request.user.is_staff else request.user.pk)
+        return Response({'updated': sum(result['result'] == OrderStatusService.UPDATED for result in results),
+                         'results': results})
+
+
+
 class HasOrderedProduct(APIView):
     permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get(self, request, product_id):
-        user = request.user
-        has_ordered = OrderItem.objects.filter(order__user=user, product_id=product_id).exists()
-        return Response({"hasOrdered": has_ordered})
-    
\ No newline at end of file
+        return Response({"hasOrdered": product_id in purchased_product_ids(request.user.pk)})
+    
+
+
+
+class OrderEventFeed(APIView):
+    """The order event log for reporting jobs; page through it with `after` = the last id received"""
+    permission_classes = [IsAdminUser]
+
+    @OrderEventEndpoints.list
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', 500)), 1000)
+        except ValueError:
+            raise ValidationError({'after': "after and limit must be integers"})
+        events = committed_events(after, max(limit, 1))
+        return Response({
+            'results': orderSz.OrderEventSerializer(events, many=True).data,
+            'next_after': events[-1].pk if events else after,
+        })
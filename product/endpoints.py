@@ -1,17 +1,23 @@
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from product.serializers import CategorySerializer, ProductSerializer, ProductImageSerializer, ReviewSerializer
+from product.serializers import CategorySerializer, ProductSerializer, ProductListSerializer, ProductImageSerializer, ReviewSerializer, InventoryUpdateSerializer
+
+INCLUDE = openapi.Parameter('include', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                            description="Opt-in extra fields. `has_ordered`: whether the requesting user has ordered the product")
 
 
 class ProductEndpoints:
     list = swagger_auto_schema(
         operation_summary="List Products",
-        operation_description="Retrieve a list of all products. Supports search, ordering, and filtering by category.",
-        responses={200: ProductSerializer(many=True)}
+        operation_description="Retrieve a list of all products with their primary image and seller name. Supports full-text search ranked by relevance, ordering (including by average_rating and review_count), and filtering by category, price and rating (rating__gte, rating__lte). Paginated by cursor; pass `page` for numbered pages.",
+        manual_parameters=[INCLUDE],
+        responses={200: ProductListSerializer(many=True)}
     )
 
     retrieve = swagger_auto_schema(
         operation_summary="Retrieve Product",
-        operation_description="Retrieve details of a specific product by ID.",
+        operation_description="Retrieve details of a specific product by ID, including all images and reviews.",
+        manual_parameters=[INCLUDE],
         responses={200: ProductSerializer}
     )
 
@@ -35,6 +41,36 @@ class ProductEndpoints:
         responses={204: 'No Content'}
     )
 
+    bulk_import = swagger_auto_schema(
+        method='post',
+        operation_summary="Bulk Import Products",
+        operation_description=(
+            "Stream a CSV or JSONL file of products (name, description, price, stock, category and optional id). "
+            "Rows with an id update that product, other rows create new ones. Invalid rows are reported per row "
+            "and skipped without aborting the import. Seller or admin only; admins may import for another seller."
+        ),
+        manual_parameters=[
+            openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True),
+            openapi.Parameter('format', openapi.IN_FORM, type=openapi.TYPE_STRING, enum=['csv', 'jsonl']),
+            openapi.Parameter('seller_id', openapi.IN_FORM, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('batch_size', openapi.IN_FORM, type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: 'Import summary with created, updated and failed counts and per-row errors'}
+    )
+
+    bulk_inventory = swagger_auto_schema(
+        method='patch',
+        operation_summary="Bulk Update Stock and Price",
+        operation_description=(
+            "Update stock and/or price of many products in one request. Each item takes an id plus an absolute "
+            "`stock` or a relative `stock_delta`, and optionally a `price`. All items are applied in one transaction, "
+            "or none are if any product is missing, not owned by the seller, or would go below zero stock or below "
+            "the units reserved in carts. Seller or admin only."
+        ),
+        request_body=InventoryUpdateSerializer,
+        responses={200: 'Updated count and the new stock and price of each product'}
+    )
+
 class ProductImageEndpoints:
     list = swagger_auto_schema(
         operation_summary="List Product Images",
@@ -1,11 +1,32 @@
-from django_filters.rest_framework import FilterSet
 from product.models import Product
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from product.search import get_search_backend, search_terms
+from django_filters.rest_framework import FilterSet, NumberFilter
 
 
 class ProductFilter(FilterSet):
+    rating__gte = NumberFilter(field_name='average_rating', lookup_expr='gte')
+    rating__lte = NumberFilter(field_name='average_rating', lookup_expr='lte')
+
     class Meta:
         model = Product
         fields = {
             'category_id': ['exact'],
-            'price': ['gt', 'lt']
-        }
\ No newline at end of file
+            'price': ['gt', 'lt'],
+            'review_count': ['gte'],
+        }
+
+
+class ProductSearchFilter(SearchFilter):
+    """`?search=` over the full-text product index, ranked by relevance unless an explicit ordering is requested"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = search_terms(request.query_params.get(self.search_param, ''))
+        if not terms:
+            return queryset
+
+        queryset = get_search_backend().search(queryset, terms)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', 'id')
+        return queryset
@@ -0,0 +1,129 @@
+import csv
+import json
+from itertools import islice
+from django.db import transaction
+from django.utils import timezone
+from api.caching import invalidate_catalog
+from product.models import Product, Category
+from product.search import get_search_backend
+from product.signals import prices_changed
+from product.serializers import ProductImportRowSerializer
+
+
+class ProductImporter:
+    """
+    Streams CSV or JSONL product rows into the catalog in fixed-size batches.
+    Rows with an `id` update that product (which must belong to the seller, unless importing as admin),
+    writing only the optional columns the row has; other rows create new products. Invalid rows are reported and skipped without aborting their batch,
+    and only one batch is held in memory at a time.
+    """
+    FORMATS = ('csv', 'jsonl')
+    UPDATE_FIELDS = ['name', 'price', 'stock', 'category', 'updated_at']
+    OPTIONAL_FIELDS = ['description']
+
+    def __init__(self, seller, batch_size=500, max_errors=1000, any_seller=False):
+        self.seller = seller
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.any_seller = any_seller
+        self.created = self.updated = self.failed = 0
+        self.errors = []
+
+    @classmethod
+    def detect_format(cls, filename):
+        return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+    def read_rows(self, lines, fmt):
+        """Yield (row number, dict) pairs from an iterable of text lines"""
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(lines), start=2):
+                # empty cells mean "not given", so optional columns fall back to their defaults
+                yield number, {key: value for key, value in row.items() if value != ''}
+            return
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {'__error__': f"Invalid JSON: {e}"}
+            yield number, row
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        return self.summary()
+
+    def summary(self):
+        return {'created': self.created, 'updated': self.updated, 'failed': self.failed, 'errors': self.errors}
+
+    def add_error(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def import_batch(self, batch):
+        category_ids = set()
+        for _, row in batch:
+            if isinstance(row, dict) and str(row.get('category', '')).isdigit():
+                category_ids.add(int(row['category']))
+        known_categories = set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+
+        valid = []
+        for number, row in batch:
+            if not isinstance(row, dict) or '__error__' in row:
+                self.add_error(number, {'non_field_errors': [row.get('__error__') if isinstance(row, dict) else "Row must be an object"]})
+                continue
+            serializer = ProductImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                self.add_error(number, serializer.errors)
+                continue
+            data = serializer.validated_data
+            if data['category'] not in known_categories:
+                self.add_error(number, {'category': [f"Category with {data['category']} doesnot exists"]})
+                continue
+            valid.append((number, data))
+
+        update_ids = [data['id'] for _, data in valid if data.get('id')]
+        owned = Product.objects.filter(id__in=update_ids)
+        if not self.any_seller:
+            owned = owned.filter(seller=self.seller)
+        owned = dict(owned.values_list('id', 'category_id'))
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        # Updates grouped by the optional columns they carry, so a missing column keeps its stored value
+        update_groups = {}
+        for number, data in valid:
+            product_id = data.pop('id', None)
+            present = tuple(name for name in self.OPTIONAL_FIELDS if name in data)
+            product = Product(seller=self.seller, category_id=data.pop('category'), **data)
+            if product_id is None:
+                to_create.append(product)
+            elif product_id in owned:
+                product.pk = product_id
+                product.updated_at = now
+                to_update.append(product)
+                update_groups.setdefault(present, []).append(product)
+            else:
+                self.add_error(number, {'id': [f"Product with {product_id} doesnot exists"]})
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            for present, products in update_groups.items():
+                Product.objects.bulk_update(products, self.UPDATE_FIELDS + list(present), batch_size=self.batch_size)
+
+        # bulk writes skip model signals, so refresh the search index and cached reads here
+        product_ids = [product.pk for product in to_create + to_update]
+        if product_ids:
+            get_search_backend().index(product_ids)
+            category_ids = {product.category_id for product in to_create + to_update}
+            category_ids.update(owned[product.pk] for product in to_update)
+            invalidate_catalog(product_ids=product_ids, category_ids=category_ids)
+            prices_changed.send(sender=Product, product_ids=[product.pk for product in to_update])
+        self.created += len(to_create)
+        self.updated += len(to_update)
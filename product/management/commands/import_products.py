@@ -0,0 +1,31 @@
+import json
+from django.contrib.auth import get_user_model
+from product.importers import ProductImporter
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSONL file into the catalog for a seller"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--seller', required=True, help="Email of the seller the products belong to")
+        parser.add_argument('--format', choices=ProductImporter.FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-errors', type=int, default=100, help="Row errors to print")
+
+    def handle(self, *args, **options):
+        try:
+            seller = get_user_model().objects.get(email=options['seller'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['seller']}")
+
+        fmt = options['format'] or ProductImporter.detect_format(options['path'])
+        importer = ProductImporter(seller, batch_size=options['batch_size'], max_errors=options['max_errors'], any_seller=True)
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            summary = importer.run(importer.read_rows(lines, fmt))
+
+        for error in summary['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary['created']}, updated {summary['updated']}, failed {summary['failed']}"))
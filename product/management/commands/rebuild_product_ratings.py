@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from product.services import ProductRatingService
+
+
+class Command(BaseCommand):
+    help = "Rebuild review count, average rating and star histogram of every product from its reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuilt = ProductRatingService.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {rebuilt} reviewed products"))
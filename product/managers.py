@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class ProductQuerySet(models.QuerySet):
+    def for_list(self):
+        """Catalog listing: scalar fields, seller name and images in a constant number of queries"""
+        from product.models import ProductImage
+
+        return (self.defer('description')
+                .select_related('seller')
+                .prefetch_related(models.Prefetch('images', queryset=ProductImage.objects.order_by('id'))))
+
+    def for_detail(self):
+        """Product page: full nesting with reviews and reviewers loaded up front"""
+        from product.models import ProductImage, Review
+
+        return (self.select_related('seller')
+                .prefetch_related(
+                    models.Prefetch('images', queryset=ProductImage.objects.order_by('id')),
+                    models.Prefetch('reviews', queryset=Review.objects.select_related('user'))))
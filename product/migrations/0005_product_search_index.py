@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+POSTGRES_VECTOR_SQL = ("setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+                       "setweight(to_tsvector('english', coalesce(description, '')), 'B')")
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE product_product ADD COLUMN search_vector tsvector")
+        schema_editor.execute(f"UPDATE product_product SET search_vector = {POSTGRES_VECTOR_SQL}")
+        schema_editor.execute(
+            "CREATE INDEX product_search_vector_gin ON product_product USING gin (search_vector)")
+    else:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE product_search_index USING fts5(name, description, tokenize='porter unicode61')")
+        schema_editor.execute(
+            "INSERT INTO product_search_index (rowid, name, description) "
+            "SELECT id, name, description FROM product_product")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS product_search_vector_gin")
+        schema_editor.execute("ALTER TABLE product_product DROP COLUMN IF EXISTS search_vector")
+    else:
+        schema_editor.execute("DROP TABLE IF EXISTS product_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
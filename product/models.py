@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from product.validators import validate_file_size
+from product.managers import ProductQuerySet
 from cloudinary.models import CloudinaryField
 
 
@@ -22,13 +23,59 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
+    reserved_stock = models.PositiveIntegerField(default=0, editable=False)
     category = models.ForeignKey(
         Category, on_delete=models.CASCADE, related_name="products")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Only ever moved by F() updates, so a save of a stale instance must not write them back
+    COUNTER_FIELDS = frozenset([
+        'reserved_stock', 'review_count', 'rating_sum', 'average_rating',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    ])
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-updated_at', '-id'], name='product_updated_id_idx'),
+            models.Index(fields=['category', '-updated_at', '-id'], name='product_cat_updated_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+        # The saved values are what the next save's signal handlers compare against
+        self._loaded_category_id, self._loaded_price = self.category_id, self.price
+
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved_stock, 0)
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
     
 
 
@@ -49,5 +96,10 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user.first_name} on {self.product.name}"
\ No newline at end of file
@@ -1,5 +1,164 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import operator
+import datetime
+from functools import reduce
+from base64 import b64decode, b64encode
+from django.db.models import Q
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from rest_framework.exceptions import NotFound
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 
 class DefaultPagination(PageNumberPagination):
-    page_size = 12
\ No newline at end of file
+    page_size = 12
+
+
+class CursorValueEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds, which would skip rows sharing a timestamp prefix
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the full ordering tuple, e.g. `(created_at, id)`.
+    Every page is a `WHERE (created_at, id) < (...)` range scan: no COUNT and no OFFSET.
+    The queryset's own ordering (from OrderingFilter or search ranking) wins over `ordering`;
+    the primary key is always appended as tie-breaker. Ordering fields must be non-nullable.
+    """
+    page_size = 12
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.convert_position(queryset, position)
+        ordering = [self._flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        page = results[:self.page_size]
+        has_more = len(results) > len(page)
+        if reverse:
+            page.reverse()
+
+        self.page = page
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or list(self.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor((self._position(self.page[-1]), False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor((self._position(self.page[0]), True))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def convert_position(self, queryset, position):
+        """Parse the cursor's values with their ordering fields, so a tampered cursor is a 404 rather than a 500"""
+        values = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            try:
+                if value is None:
+                    raise ValueError
+                if name in queryset.query.annotations:
+                    model_field = queryset.query.annotations[name].output_field
+                else:
+                    model_field = queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name)
+                values.append(model_field.to_python(value))
+            except FieldDoesNotExist:
+                values.append(value)
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, cursor):
+        position, reverse = cursor
+        payload = json.dumps({'p': position, 'r': int(reverse)}, cls=CursorValueEncoder)
+        encoded = b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _position(self, instance):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(value)
+        return values
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, position):
+        """Rows strictly after `position` in `ordering`, expanded as (a > x) OR (a = x AND b > y) OR ..."""
+        first = ordering[0]
+        # Redundant bound on the leading column so the planner can turn this into an index range scan
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        terms = []
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f"{field.lstrip('-')}__{lookup}": position[index]})
+            for previous_field, value in zip(ordering[:index], position[:index]):
+                term &= Q(**{previous_field.lstrip('-'): value})
+            terms.append(term)
+        return bound & reduce(operator.or_, terms)
+
+
+class CatalogPagination(KeysetPagination):
+    """Keyset pages by default; `?page=N` opts into numbered pages for the storefront"""
+    ordering = ('-updated_at', '-id')
+    page_number_class = DefaultPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if request.query_params.get(self.page_number_class.page_query_param):
+            self.page_number_paginator = self.page_number_class()
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.ordering)
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
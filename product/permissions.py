@@ -1,3 +1,4 @@
+from api.roles import is_seller
 from rest_framework import permissions
 
 
@@ -12,7 +13,7 @@ class IsReviewWriterOrReadonly(permissions.BasePermission):
             return True
         if request.user.is_staff:
             return True
-        if request.user.groups.filter(name="seller").exists():
+        if is_seller(request.user):
             return True
         return obj.user == request.user
 
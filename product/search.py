@@ -0,0 +1,76 @@
+import re
+from django.db import connection
+from product.models import Product
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+class PostgresProductSearch:
+    """Weighted `search_vector` tsvector column on product_product, backed by a GIN index (see migration 0005)"""
+
+    VECTOR_SQL = ("setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+                  "setweight(to_tsvector('english', coalesce(description, '')), 'B')")
+
+    def index(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Product._meta.db_table} SET search_vector = {self.VECTOR_SQL} WHERE id = ANY(%s)",
+                [list(product_ids)])
+
+    def remove(self, product_ids):
+        # The vector lives on the product row and goes away with it
+        pass
+
+    def search(self, queryset, terms):
+        table = Product._meta.db_table
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return (queryset
+                .filter(RawSQL(f"{table}.search_vector @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField()))
+                .annotate(search_rank=RawSQL(f"ts_rank({table}.search_vector, to_tsquery('english', %s))::float8",
+                                             [tsquery], output_field=FloatField())))
+
+
+class SQLiteProductSearch:
+    """FTS5 table `product_search_index` keyed by product id, so local dev and tests run the same code path"""
+
+    INDEX_TABLE = 'product_search_index'
+
+    def index(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.INDEX_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+            cursor.execute(
+                f"INSERT INTO {self.INDEX_TABLE} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table} WHERE id IN ({placeholders})",
+                product_ids)
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.INDEX_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+
+    def search(self, queryset, terms):
+        table, index = Product._meta.db_table, self.INDEX_TABLE
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # bm25() is lower-is-better; negate it so both backends sort by -search_rank
+        return (queryset
+                .filter(RawSQL(f"{table}.id IN (SELECT rowid FROM {index} WHERE {index} MATCH %s)",
+                               [match], output_field=BooleanField()))
+                .annotate(search_rank=RawSQL(
+                    f"(SELECT -bm25({index}, 10.0, 1.0) FROM {index} WHERE {index} MATCH %s AND rowid = {table}.id)",
+                    [match], output_field=FloatField())))
+
+
+def search_terms(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def get_search_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresProductSearch()
+    return SQLiteProductSearch()
@@ -50,16 +50,86 @@ class ReviewSerializer(serializers.ModelSerializer):
         return Review.objects.create(product_id=product_id, **validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class HasOrderedMixin:
+    """Adds `has_ordered` when the view put the user's `purchased_ids` in the context (`?include=has_ordered`)"""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        purchased_ids = self.context.get('purchased_ids')
+        if purchased_ids is not None:
+            data['has_ordered'] = instance.pk in purchased_ids
+        return data
+
+
+class ProductSerializer(HasOrderedMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
     seller = SimpleUserSerializer(read_only=True)
 
     class Meta:
         model = Product
-        fields = ['id', 'name','description', 'images','price','stock','category','reviews', 'seller']
+        fields = ['id', 'name','description', 'images','price','stock', 'available_stock', 'category','reviews', 'seller',
+                  'review_count', 'average_rating', 'rating_histogram']
+
+    def validate_price(self, price):
+        if price < 0:
+            raise serializers.ValidationError('Price can not be negative')
+        return price
+
+
+class ProductListSerializer(HasOrderedMixin, serializers.ModelSerializer):
+    image = serializers.SerializerMethodField(method_name='get_primary_image')
+    seller_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'image', 'price', 'stock', 'available_stock', 'category', 'seller_name', 'review_count', 'average_rating']
+
+    def get_primary_image(self, obj):
+        image = next(iter(obj.images.all()), None)
+        if image is None:
+            return None
+        return ProductImageSerializer(image, context=self.context).data['image']
+
+    def get_seller_name(self, obj):
+        return obj.seller.get_full_name()
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False, allow_null=True)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(allow_blank=True, required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    stock = serializers.IntegerField(min_value=0)
+    category = serializers.IntegerField()
+
+    def validate_price(self, price):
+        if price < 0:
+            raise serializers.ValidationError('Price can not be negative')
+        return price
+
+    def validate_id(self, value):
+        return value or None
+
+
+class InventoryItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    stock = serializers.IntegerField(min_value=0, required=False)
+    stock_delta = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
     def validate_price(self, price):
         if price < 0:
             raise serializers.ValidationError('Price can not be negative')
         return price
+
+    def validate(self, attrs):
+        if 'stock' in attrs and 'stock_delta' in attrs:
+            raise serializers.ValidationError('Give either stock or stock_delta, not both')
+        if not {'stock', 'stock_delta', 'price'} & set(attrs):
+            raise serializers.ValidationError('Nothing to update')
+        return attrs
+
+
+class InventoryUpdateSerializer(serializers.Serializer):
+    items = InventoryItemSerializer(many=True, allow_empty=False, max_length=5000)
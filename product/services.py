@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.utils import timezone
+from product.models import Product, Review
+from api.caching import invalidate_catalog
+from product.signals import prices_changed
+from rest_framework.exceptions import ValidationError
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+
+class ProductRatingService:
+    STARS = range(1, 6)
+
+    @staticmethod
+    def apply(product_id, added=None, removed=None):
+        """Fold one review rating in and/or out of the product's aggregates with a single UPDATE"""
+        count_delta = (added is not None) - (removed is not None)
+        sum_delta = (added or 0) - (removed or 0)
+
+        bucket_deltas = {}
+        if added is not None:
+            bucket_deltas[added] = bucket_deltas.get(added, 0) + 1
+        if removed is not None:
+            bucket_deltas[removed] = bucket_deltas.get(removed, 0) - 1
+
+        updates = {
+            f'rating_{star}_count': F(f'rating_{star}_count') + delta
+            for star, delta in bucket_deltas.items() if delta
+        }
+        if count_delta or sum_delta:
+            # All right-hand sides see the pre-update row, so the new average is computed from the old totals plus deltas
+            updates['review_count'] = F('review_count') + count_delta
+            updates['rating_sum'] = F('rating_sum') + sum_delta
+            updates['average_rating'] = Case(
+                When(review_count__lte=-count_delta, then=Value(0.0)),
+                default=Cast(F('rating_sum') + sum_delta, FloatField()) / (F('review_count') + count_delta),
+                output_field=FloatField(),
+            )
+        if updates:
+            Product.objects.filter(pk=product_id).update(**updates)
+
+    @staticmethod
+    def rebuild(batch_size=500):
+        """Recompute every product's aggregates from the Review table. Returns the number of products with reviews"""
+        reset = {'review_count': 0, 'rating_sum': 0, 'average_rating': 0}
+        reset.update({f'rating_{star}_count': 0 for star in ProductRatingService.STARS})
+        Product.objects.update(**reset)
+
+        stats = (Review.objects.order_by().values('product_id')
+                 .annotate(count=Count('id'), total=Sum('ratings'),
+                           **{f'stars_{star}': Count('id', filter=Q(ratings=star)) for star in ProductRatingService.STARS}))
+
+        fields = list(reset)
+        batch, rebuilt = [], 0
+        for row in stats.iterator(chunk_size=batch_size):
+            product = Product(pk=row['product_id'], review_count=row['count'], rating_sum=row['total'],
+                              average_rating=round(row['total'] / row['count'], 2))
+            for star in ProductRatingService.STARS:
+                setattr(product, f'rating_{star}_count', row[f'stars_{star}'])
+            batch.append(product)
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, fields)
+                rebuilt += len(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, fields)
+            rebuilt += len(batch)
+        return rebuilt
+
+
+class InventoryService:
+    @staticmethod
+    def apply(items, seller=None):
+        """
+        Apply absolute `stock`, relative `stock_delta` and `price` changes to many products at once.
+        Ownership is checked (and the rows locked) with one query, then everything is written with one UPDATE.
+        Pass `seller=None` to skip the ownership check (admins). Returns the new stock and price per product.
+        """
+        ids = {item['id'] for item in items}
+        with transaction.atomic():
+            products = Product.objects.select_for_update().filter(id__in=ids)
+            if seller is not None:
+                products = products.filter(seller=seller)
+            current = {row[0]: list(row[1:]) for row in products.order_by('id').values_list('id', 'stock', 'price', 'category_id', 'reserved_stock')}
+
+            missing = sorted(ids - set(current))
+            if missing:
+                raise ValidationError({'items': f"Products {', '.join(map(str, missing))} doesnot exists"})
+
+            # Items are applied in order, so repeated ids accumulate like separate requests would
+            for item in items:
+                state = current[item['id']]
+                if 'stock' in item:
+                    state[0] = item['stock']
+                state[0] += item.get('stock_delta', 0)
+                if state[0] < 0:
+                    raise ValidationError({'items': f"Stock for product {item['id']} can not go below zero"})
+                # Open carts hold `reserved_stock` units, which checkout will still take out of stock
+                if state[0] < state[3]:
+                    raise ValidationError({'items': f"Stock for product {item['id']} can not go below the "
+                                                    f"{state[3]} units reserved in carts"})
+                if 'price' in item:
+                    state[1] = item['price']
+
+            updates = {'updated_at': timezone.now()}
+            for position, field in enumerate(['stock', 'price']):
+                updates[field] = Case(
+                    *[When(id=product_id, then=Value(state[position])) for product_id, state in current.items()],
+                    default=F(field), output_field=Product._meta.get_field(field))
+            Product.objects.filter(id__in=current).update(**updates)
+
+        # Queryset updates skip model signals, so invalidate cached catalog reads here
+        invalidate_catalog(product_ids=current, category_ids={state[2] for state in current.values()})
+        prices_changed.send(sender=Product, product_ids=[item['id'] for item in items if 'price' in item])
+        return [{'id': product_id, 'stock': state[0], 'price': state[1]} for product_id, state in current.items()]
@@ -0,0 +1,42 @@
+from django.dispatch import Signal, receiver
+from api.caching import invalidate_catalog
+from product.search import get_search_backend
+from django.db.models.signals import post_save, post_delete
+from product.models import Product, ProductImage, Review, Category
+
+
+SEARCHABLE_FIELDS = {'name', 'description'}
+
+# Sent with `product_ids` by bulk writes that change prices without Model.save()
+prices_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHABLE_FIELDS.intersection(update_fields):
+        return
+    get_search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    # A product moved to another category must also drop out of its old category's listings
+    category_ids = {instance.category_id, getattr(instance, '_loaded_category_id', None)}
+    invalidate_catalog(product_ids=[instance.pk], category_ids=category_ids)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_product_children(sender, instance, **kwargs):
+    category_ids = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True)
+    invalidate_catalog(product_ids=[instance.product_id], category_ids=list(category_ids))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    invalidate_catalog(category_ids=[instance.pk])
@@ -1,3 +1,401 @@
+import os
+import json
+import tempfile
+from io import StringIO
+from base64 import b64encode
 from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.contrib.auth.models import Group
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from product.models import Category, Product, ProductImage, Review
 
-# Create your tests here.
+User = get_user_model()
+
+
+def make_seller(email='seller@example.com'):
+    seller = User.objects.create_user(email=email, password='x', first_name='Sel', last_name='Ler')
+    seller.groups.add(Group.objects.get_or_create(name='seller')[0])
+    return seller
+
+
+def make_products(seller, category, count=3, **fields):
+    products = []
+    for index in range(count):
+        product = Product.objects.create(seller=seller, category=category, name=f'banana {index}',
+                                         description='yellow fruit', price=2, stock=10, **fields)
+        ProductImage.objects.create(product=product, image='image/upload/v1/banana.jpg')
+        products.append(product)
+    return products
+
+
+class ProductListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        self.category = Category.objects.create(name='Fruit')
+        self.products = make_products(self.seller, self.category)
+        for product in self.products:
+            for ratings in (3, 5):
+                Review.objects.create(product=product, user=self.buyer, ratings=ratings, comment='ok')
+
+    def test_list_items_are_lean(self):
+        response = APIClient().get('/api/v1/products/')
+        self.assertEqual(response.status_code, 200)
+        item = response.json()['results'][0]
+        self.assertNotIn('reviews', item)
+        self.assertNotIn('images', item)
+        self.assertTrue(item['image'].endswith('banana.jpg'))
+        self.assertEqual(item['seller_name'], 'Sel Ler')
+
+    def test_list_query_count_does_not_grow_with_products(self):
+        client = APIClient()
+        with self.assertNumQueries(2):
+            client.get('/api/v1/products/')
+        make_products(self.seller, self.category, count=5)
+        cache.clear()
+        with self.assertNumQueries(2):
+            client.get('/api/v1/products/')
+
+    def test_detail_keeps_reviews(self):
+        response = APIClient().get(f'/api/v1/products/{self.products[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['reviews']), 2)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        self.category = Category.objects.create(name='Fruit')
+        self.product, self.other = make_products(self.seller, self.category, count=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.url = f'/api/v1/products/{self.product.pk}/reviews/'
+
+    def review(self, ratings):
+        response = self.client.post(self.url, {'ratings': ratings, 'comment': 'x'})
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_aggregates_follow_create_update_and_delete(self):
+        first = self.review(5)
+        self.review(4)
+        last = self.review(1)
+        self.client.patch(f'{self.url}{first}/', {'ratings': 3})
+        self.client.delete(f'{self.url}{last}/')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 2)
+        self.assertEqual(self.product.rating_sum, 7)
+        self.assertEqual(str(self.product.average_rating), '3.50')
+        self.assertEqual(self.product.rating_histogram, {1: 0, 2: 0, 3: 1, 4: 1, 5: 0})
+
+    def test_rebuild_recomputes_from_reviews(self):
+        self.review(5)
+        self.review(2)
+        Product.objects.update(review_count=99, rating_sum=0)
+        call_command('rebuild_product_ratings', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.product.review_count, self.product.rating_sum), (2, 7))
+        self.assertEqual(self.other.review_count, 0)
+
+    def test_filter_and_order_by_rating(self):
+        self.review(5)
+        client = APIClient()
+        ids = [item['id'] for item in client.get('/api/v1/products/?rating__gte=4').json()['results']]
+        self.assertEqual(ids, [self.product.pk])
+        ids = [item['id'] for item in client.get('/api/v1/products/?ordering=-average_rating').json()['results']]
+        self.assertEqual(ids[0], self.product.pk)
+        detail = client.get(f'/api/v1/products/{self.product.pk}/').json()
+        self.assertEqual(detail['rating_histogram']['5'], 1)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = make_seller()
+        category = Category.objects.create(name='Fruit')
+        self.banana = Product.objects.create(seller=seller, category=category, name='Banana', description='yellow',
+                                             price=2, stock=5)
+        self.juice = Product.objects.create(seller=seller, category=category, name='Mango juice',
+                                            description='sweet drink with banana bits', price=3, stock=5)
+        self.apple = Product.objects.create(seller=seller, category=category, name='Apple', description='red',
+                                            price=3, stock=5)
+
+    def search(self, query, **params):
+        response = APIClient().get('/api/v1/products/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_prefix_match_ranks_name_above_description(self):
+        self.assertEqual(self.search('banan'), [self.banana.pk, self.juice.pk])
+
+    def test_explicit_ordering_wins_over_rank(self):
+        self.assertEqual(self.search('banana', ordering='-price'), [self.juice.pk, self.banana.pk])
+
+    def test_punctuation_is_ignored(self):
+        self.assertEqual(self.search('sweet "drink'), [self.juice.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.apple.name = 'Green banana'
+        self.apple.save()
+        cache.clear()
+        self.assertIn(self.apple.pk, self.search('green'))
+        self.apple.delete()
+        cache.clear()
+        self.assertEqual(self.search('green'), [])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = make_seller()
+        category = Category.objects.create(name='Fruit')
+        self.products = make_products(seller, category, count=30)
+        # Ties on the ordering columns must not skip or repeat rows across pages
+        Product.objects.filter(pk__in=[product.pk for product in self.products[:15]]).update(
+            updated_at=self.products[0].updated_at, price=3)
+        self.client = APIClient()
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        return seen
+
+    def test_every_row_exactly_once(self):
+        expected = sorted(product.pk for product in self.products)
+        for url in ['/api/v1/products/', '/api/v1/products/?ordering=price',
+                    '/api/v1/products/?ordering=-price&page_size=7', '/api/v1/products/?search=banana&page_size=5']:
+            with self.subTest(url=url):
+                self.assertEqual(sorted(self.walk(url)), expected)
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get('/api/v1/products/?ordering=price&page_size=7').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(self.client.get(second['next']).json()['previous']).json()
+        self.assertEqual([item['id'] for item in back['results']], [item['id'] for item in second['results']])
+
+    def test_page_param_gives_numbered_pages(self):
+        body = self.client.get('/api/v1/products/?page=2').json()
+        self.assertEqual(body['count'], 30)
+
+    def test_tampered_cursors_are_404(self):
+        for position in (['notadate', 1], ['2026-01-01T00:00:00+00:00', 'abc'], [None, 1], [[1], 1]):
+            cursor = b64encode(json.dumps({'p': position}).encode()).decode()
+            with self.subTest(position=position):
+                self.assertEqual(self.client.get('/api/v1/products/', {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/products/', {'cursor': 'zzz'}).status_code, 404)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.category = Category.objects.create(name='Fruit')
+        self.other_category = Category.objects.create(name='Other')
+        self.products = make_products(self.seller, self.category, count=2)
+        self.client = APIClient()
+
+    def get(self, url):
+        return self.client.get(url)['X-Cache']
+
+    def test_second_anonymous_read_is_a_hit(self):
+        url = f'/api/v1/products/{self.products[0].pk}/'
+        self.assertEqual(self.get(url), 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(url), 'HIT')
+
+    def test_save_invalidates_once_committed(self):
+        product = self.products[0]
+        list_url, category_url = '/api/v1/products/', f'/api/v1/products/?category_id={self.category.pk}'
+        for url in (list_url, category_url):
+            self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.category = self.other_category
+            product.save()
+        self.assertEqual(self.get(list_url), 'MISS')
+        self.assertEqual(self.get(category_url), 'MISS')
+        self.assertNotIn(product.pk, [item['id'] for item in self.client.get(category_url).json()['results']])
+
+    def test_no_bump_before_commit(self):
+        url = f'/api/v1/products/{self.products[0].pk}/'
+        self.get(url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Review.objects.create(product=self.products[0], user=self.seller, ratings=4, comment='x')
+            self.assertEqual(self.get(url), 'HIT')
+        self.assertTrue(callbacks)
+
+    def test_authenticated_reads_bypass_the_cache(self):
+        self.client.force_authenticate(self.seller)
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Cache', response)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.category = Category.objects.create(name='Fruit')
+        self.product = make_products(self.seller, self.category, count=2)[0]
+        self.client = APIClient()
+
+    def test_matching_etag_is_304(self):
+        url = f'/api/v1/products/{self.product.pk}/'
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_if_modified_since_is_304(self):
+        response = self.client.get('/api/v1/products/')
+        not_modified = self.client.get('/api/v1/products/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_query_params_are_part_of_the_etag(self):
+        etag = self.client.get('/api/v1/products/', {'ordering': 'price'})['ETag']
+        self.assertEqual(self.client.get('/api/v1/products/', {'ordering': 'price'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/v1/products/', {'ordering': '-price'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_change_gives_a_new_etag(self):
+        url = f'/api/v1/products/{self.product.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'plantain'
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'plantain')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.category = Category.objects.create(name='Fruit')
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def upload(self, content, name='products.csv', **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        response = self.client.post('/api/v1/products/import/', {'file': upload, **data}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rows_without_id_are_created(self):
+        rows = ''.join(f'apple {index},red,1.50,{index},{self.category.pk}\n' for index in range(5))
+        summary = self.upload('name,description,price,stock,category\n' + rows, batch_size=2)
+        self.assertEqual((summary['created'], summary['updated'], summary['failed']), (5, 0, 0))
+        self.assertEqual(Product.objects.filter(seller=self.seller, description='red').count(), 5)
+
+    def test_rows_with_id_update_and_keep_missing_columns(self):
+        kept, blanked = make_products(self.seller, self.category, count=2)
+        summary = self.upload(
+            'id,name,price,stock,category\n'
+            f'{kept.pk},kept,3,4,{self.category.pk}\n', name='update.csv')
+        self.assertEqual((summary['created'], summary['updated']), (0, 1))
+        kept.refresh_from_db()
+        self.assertEqual((kept.name, kept.price, kept.stock, kept.description), ('kept', 3, 4, 'yellow fruit'))
+
+        self.upload(f'{{"id": {blanked.pk}, "name": "blank", "description": "", "price": 1, "stock": 1, '
+                    f'"category": {self.category.pk}}}\n', name='update.jsonl')
+        blanked.refresh_from_db()
+        self.assertEqual(blanked.description, '')
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        foreign = make_products(make_seller('other@example.com'), self.category, count=1)[0]
+        summary = self.upload(
+            f'{{"name": "ok", "price": 1, "stock": 1, "category": {self.category.pk}}}\n'
+            '{"name": "no category", "price": 1, "stock": 1, "category": 999}\n'
+            f'{{"id": {foreign.pk}, "name": "not mine", "price": 1, "stock": 1, "category": {self.category.pk}}}\n'
+            f'{{"name": "negative", "price": -1, "stock": 1, "category": {self.category.pk}}}\n'
+            'not json\n', name='products.jsonl')
+        self.assertEqual((summary['created'], summary['failed']), (1, 4))
+        errors = {error['row']: error['errors'] for error in summary['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5])
+        self.assertIn('category', errors[2])
+        self.assertIn('id', errors[3])
+        self.assertIn('price', errors[4])
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.name, 'banana 0')
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(f'name,price,stock,category\npear,2,3,{self.category.pk}\n')
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command('import_products', handle.name, seller=self.seller.email, stdout=out)
+        self.assertIn('Created 1', out.getvalue())
+        self.assertTrue(Product.objects.filter(name='pear', seller=self.seller).exists())
+
+
+class BulkInventoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_seller()
+        self.category = Category.objects.create(name='Fruit')
+        self.first, self.second = make_products(self.seller, self.category, count=2)
+        self.foreign = make_products(make_seller('other@example.com'), self.category, count=1)[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def patch(self, *items):
+        return self.client.patch('/api/v1/products/inventory/', {'items': list(items)}, format='json')
+
+    def test_updates_stock_and_price_in_one_call(self):
+        response = self.patch({'id': self.first.pk, 'stock': 50, 'price': '2.50'},
+                              {'id': self.second.pk, 'stock_delta': -3},
+                              {'id': self.second.pk, 'stock_delta': 1})
+        self.assertEqual(response.status_code, 200)
+        products = {product['id']: product for product in response.json()['products']}
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(products[self.first.pk]['stock'], 50)
+        self.assertEqual(products[self.first.pk]['price'], 2.5)
+        self.assertEqual(products[self.second.pk]['stock'], 8)
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.stock, str(self.first.price)), (50, '2.50'))
+
+    def test_other_sellers_products_are_rejected(self):
+        response = self.patch({'id': self.first.pk, 'stock': 1}, {'id': self.foreign.pk, 'stock': 1})
+        self.assertEqual(response.status_code, 400)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 10)
+
+    def test_admin_may_update_any_product(self):
+        self.client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='x'))
+        self.assertEqual(self.patch({'id': self.foreign.pk, 'stock': 1}).status_code, 200)
+
+    def test_stock_can_not_go_below_zero_or_reserved(self):
+        self.assertEqual(self.patch({'id': self.first.pk, 'stock_delta': -11}).status_code, 400)
+        Product.objects.filter(pk=self.first.pk).update(reserved_stock=4)
+        response = self.patch({'id': self.first.pk, 'stock': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reserved', response.json()['items'])
+        self.assertEqual(self.patch({'id': self.first.pk, 'stock': 4}).status_code, 200)
+
+    def test_invalid_items(self):
+        for item in ({'id': self.first.pk}, {'id': self.first.pk, 'stock': 1, 'stock_delta': 1},
+                     {'id': self.first.pk, 'price': '-1'}, {'id': self.first.pk, 'stock': -1}):
+            with self.subTest(item=item):
+                self.assertEqual(self.patch(item).status_code, 400)
+
+    def test_invalidates_cached_reads(self):
+        url = f'/api/v1/products/{self.first.pk}/'
+        APIClient().get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patch({'id': self.first.pk, 'stock': 7})
+        response = APIClient().get(url)
+        self.assertEqual((response['X-Cache'], response.json()['stock']), ('MISS', 7))
@@ -1,42 +1,84 @@
 from drf_yasg import openapi
+from api.roles import is_seller
+from django.db import transaction
 from django.db.models import Count
-from product.filters import ProductFilter
+from product.filters import ProductFilter, ProductSearchFilter
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.permissions import AllowAny
 from rest_framework.viewsets import ModelViewSet
-from product.paginations import DefaultPagination
-from rest_framework.exceptions import PermissionDenied
+from api.caching import CachedResponseMixin, conditional_get
+from api.authentication import StatelessJWTAuthentication
+from product.paginations import DefaultPagination, CatalogPagination, KeysetPagination
+from product.services import ProductRatingService, InventoryService
+from product.importers import ProductImporter
+from order.purchases import purchased_product_ids, purchases_scope
+from rest_framework.response import Response
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from product.permissions import IsReviewWriterOrReadonly
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from product.models import Product, ProductImage, Category, Review
 from api.permissions import IsAdminOrReadOnly, IsSellerOrAdmin, IsSeller
 from product.endpoints import CategoryEndpoints, ProductEndpoints, ReviewEndpoints, ProductImageEndpoints
-from product.serializers import CategorySerializer, ProductSerializer, ProductImageSerializer, ReviewSerializer
+from product.serializers import CategorySerializer, ProductSerializer, ProductListSerializer, ProductImageSerializer, ReviewSerializer, InventoryUpdateSerializer
 
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(CachedResponseMixin, ModelViewSet):
+    authentication_classes = [StatelessJWTAuthentication]
     serializer_class = ProductSerializer
-    pagination_class = DefaultPagination
+    pagination_class = CatalogPagination
     filterset_class = ProductFilter
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     search_fields = ['name', 'description']
-    ordering_fields = ['price', 'updated_at','name']
+    ordering_fields = ['price', 'updated_at','name', 'average_rating', 'review_count']
 
     def get_permissions(self):
         if self.action in ['create']:
             return [IsSeller()]
-        if self.action in ['update', 'partial_update', 'destroy']:
+        if self.action in ['update', 'partial_update', 'destroy', 'bulk_import', 'bulk_inventory']:
             return [IsSellerOrAdmin()]
         return [AllowAny()]
     
 
+    def get_cache_scopes(self):
+        scopes = []
+        if self.includes_has_ordered() and self.request.user.is_authenticated:
+            scopes.append(purchases_scope(self.request.user.pk))
+        if self.action == 'retrieve':
+            return scopes + [f"product:{self.kwargs['pk']}"]
+        category_id = self.kwargs.get('category_pk') or self.request.query_params.get('category_id')
+        if category_id:
+            return scopes + [f'category:{category_id}']
+        return scopes + ['catalog']
+
+    def includes_has_ordered(self):
+        return 'has_ordered' in self.request.query_params.get('include', '').split(',')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'retrieve'] and self.includes_has_ordered():
+            user = self.request.user
+            context['purchased_ids'] = purchased_product_ids(user.pk) if user.is_authenticated else frozenset()
+        return context
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProductListSerializer
+        return ProductSerializer
+
     def get_queryset(self):
         queryset = Product.objects.all()
+        if self.action == 'list':
+            queryset = queryset.for_list()
+        elif self.action == 'retrieve':
+            queryset = queryset.for_detail()
         category_id = self.kwargs.get('category_pk')
 
-        if self.request.user.groups.filter(name='seller').exists():
-            queryset = queryset.filter(seller=self.request.user)
+        if is_seller(self.request.user):
+            queryset = queryset.filter(seller_id=self.request.user.pk)
         if category_id:
             queryset = queryset.filter(category_id=category_id)
         return queryset
@@ -45,10 +87,12 @@ class ProductViewSet(ModelViewSet):
         serializer.save(seller=self.request.user)
 
     @ProductEndpoints.list
+    @conditional_get
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
     @ProductEndpoints.retrieve
+    @conditional_get
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
@@ -64,6 +108,41 @@ class ProductViewSet(ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
+    @ProductEndpoints.bulk_import
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'This field is required.'})
+
+        fmt = request.data.get('format') or ProductImporter.detect_format(upload.name)
+        if fmt not in ProductImporter.FORMATS:
+            raise ValidationError({'format': f"Must be one of {', '.join(ProductImporter.FORMATS)}"})
+
+        seller = request.user
+        if request.user.is_staff and request.data.get('seller_id'):
+            seller = get_user_model().objects.filter(pk=request.data['seller_id']).first()
+            if seller is None:
+                raise ValidationError({'seller_id': 'Seller not found'})
+
+        try:
+            batch_size = min(int(request.data.get('batch_size') or 500), 5000)
+        except ValueError:
+            raise ValidationError({'batch_size': 'A valid integer is required.'})
+
+        importer = ProductImporter(seller, batch_size=max(batch_size, 1), any_seller=request.user.is_staff)
+        lines = (line.decode('utf-8-sig') for line in upload)
+        return Response(importer.run(importer.read_rows(lines, fmt)))
+
+    @ProductEndpoints.bulk_inventory
+    @action(detail=False, methods=['patch'], url_path='inventory')
+    def bulk_inventory(self, request):
+        serializer = InventoryUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        seller = None if request.user.is_staff else request.user
+        products = InventoryService.apply(serializer.validated_data['items'], seller=seller)
+        return Response({'updated': len(products), 'products': products})
+
 
     
 class ProductImageViewSet(ModelViewSet):
@@ -101,17 +180,23 @@ class ProductImageViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, ModelViewSet):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAdminOrReadOnly]
     serializer_class = CategorySerializer
     pagination_class = DefaultPagination
     queryset = Category.objects.annotate(product_count=Count('products')).all()
 
+    def get_cache_scopes(self):
+        return ['catalog']
+
     @CategoryEndpoints.list
+    @conditional_get
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
     @CategoryEndpoints.retrieve
+    @conditional_get
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
@@ -131,6 +216,7 @@ class CategoryViewSet(ModelViewSet):
 class ReviewViewSet(ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [IsReviewWriterOrReadonly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs.get('product_pk'))
@@ -139,10 +225,22 @@ class ReviewViewSet(ModelViewSet):
         return {'product_id': self.kwargs.get('product_pk')}
     
     def perform_create(self, serializer):
-        return serializer.save(user=self.request.user)
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user)
+            ProductRatingService.apply(review.product_id, added=review.ratings)
+        return review
     
     def perform_update(self, serializer):
-        return serializer.save(user=self.request.user)
+        with transaction.atomic():
+            previous_rating = serializer.instance.ratings
+            review = serializer.save(user=self.request.user)
+            ProductRatingService.apply(review.product_id, added=review.ratings, removed=previous_rating)
+        return review
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            ProductRatingService.apply(instance.product_id, removed=instance.ratings)
+            instance.delete()
     
 
     @ReviewEndpoints.list
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from users.models import User, Deposit
+from users.models import User, Deposit, LedgerEntry
 
 
 class CustomUserAdmin(UserAdmin):
@@ -22,6 +22,8 @@ class CustomUserAdmin(UserAdmin):
     )
     search_fields = ('email',)
     ordering = ('email',)
+    # Balance changes go through the ledger; add an adjustment entry instead of editing it
+    readonly_fields = ('balance',)
 
 
 @admin.register(Deposit)
@@ -31,5 +33,19 @@ class DepositAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'transaction_reference')
     ordering = ('-created_at',)
 
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'amount', 'deposit', 'order', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('user__email',)
+    ordering = ('-created_at',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 admin.site.register(User, CustomUserAdmin)
 
@@ -0,0 +1,35 @@
+from djoser import email
+from api.outbox import enqueue
+
+
+class QueuedEmailMixin:
+    """Render in the request, where djoser has its context, but leave delivery to the outbox worker"""
+
+    def send(self, to, *args, **kwargs):
+        self.render()
+        for address in to:
+            enqueue(to=address, subject=self.subject, body=self.body, html_body=self.html or '')
+
+
+class ActivationEmail(QueuedEmailMixin, email.ActivationEmail):
+    pass
+
+
+class ConfirmationEmail(QueuedEmailMixin, email.ConfirmationEmail):
+    pass
+
+
+class PasswordResetEmail(QueuedEmailMixin, email.PasswordResetEmail):
+    pass
+
+
+class PasswordChangedConfirmationEmail(QueuedEmailMixin, email.PasswordChangedConfirmationEmail):
+    pass
+
+
+class UsernameChangedConfirmationEmail(QueuedEmailMixin, email.UsernameChangedConfirmationEmail):
+    pass
+
+
+class UsernameResetEmail(QueuedEmailMixin, email.UsernameResetEmail):
+    pass
@@ -0,0 +1,18 @@
+from users.services import LedgerService
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Compare every user's balance with their ledger (last snapshot plus the entries since) and report mismatches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for user_id, balance, ledger_balance in LedgerService.reconcile(batch_size=options['batch_size']):
+            mismatches += 1
+            self.stdout.write(f"user {user_id}: balance {balance}, ledger {ledger_balance}")
+        if mismatches:
+            raise CommandError(f"{mismatches} balances don't match their ledger")
+        self.stdout.write(self.style.SUCCESS("All balances match their ledger"))
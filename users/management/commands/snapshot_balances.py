@@ -0,0 +1,13 @@
+from users.services import LedgerService
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Snapshot the ledger balance of every user whose ledger moved since their last snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        taken = LedgerService.take_snapshots(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Took {taken} balance snapshots"))
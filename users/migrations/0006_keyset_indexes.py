@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_deposit_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='deposit_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['-created_at', '-id'], name='deposit_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_opening_balances(apps, schema_editor):
+    # Balances from before the ledger become one opening entry each, so they reconcile
+    User = apps.get_model('users', 'User')
+    LedgerEntry = apps.get_model('users', 'LedgerEntry')
+    entries = [LedgerEntry(user_id=user_id, amount=balance, kind='opening')
+               for user_id, balance in User.objects.exclude(balance=0).values_list('id', 'balance').iterator()]
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0013_order_events'),
+        ('users', '0006_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('as_of', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'as_of')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('deposit', 'Deposit'), ('order', 'Order payment'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('deposit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='users.deposit')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='order.order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='ledger_user_created_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_opening_balances, migrations.RunPython.noop),
+    ]
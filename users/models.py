@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from users.managers import CustomUserManager
 from django.contrib.auth.models import AbstractUser
 
@@ -32,4 +33,61 @@ class Deposit(models.Model):
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
     transaction_reference = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='deposit_user_created_id_idx'),
+            models.Index(fields=['-created_at', '-id'], name='deposit_created_id_idx'),
+        ]
+
+
+class LedgerEntry(models.Model):
+    """
+    One change to a user's balance. Entries are only ever inserted; `User.balance` is kept equal to the
+    sum of a user's entries by updating it in the same transaction (see users/services.py).
+    """
+    OPENING = 'opening'
+    DEPOSIT = 'deposit'
+    ORDER = 'order'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (DEPOSIT, 'Deposit'),
+        (ORDER, 'Order payment'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ledger_entries')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    deposit = models.ForeignKey(Deposit, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    order = models.ForeignKey('order.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'ledger entries'
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='ledger_user_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are immutable")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} for {self.user_id}"
+
+
+class BalanceSnapshot(models.Model):
+    """A user's balance as the sum of their ledger entries created up to `as_of`"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    as_of = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['user', 'as_of']]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} as of {self.as_of}"
@@ -1,5 +1,14 @@
-from users.models import Deposit
+from users.models import Deposit, LedgerEntry
+from users.services import LedgerService
+from django.db import transaction
+from api.roles import get_roles
+from django.conf import settings
 from rest_framework import serializers
+from api.authentication import ROLES_CLAIM
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
+from product.models import Product
+from django.db.models import Prefetch
+from order.models import Order, Wishlist
 from order.serializers import WishlistSerializer, OrderSerializer
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer, UserSerializer as BaseUserSerializer
 
@@ -10,15 +19,60 @@ class UserCreateSerializer(BaseUserCreateSerializer):
 
 
 class UserSerializer(BaseUserSerializer):
+    """
+    Profile for `/auth/users/me`: scalar fields and counts. `?expand=orders,wishlist_items` adds the
+    most recent PROFILE_EXPAND_LIMIT of each; the full histories are paginated under /orders/ and /Wishlist/.
+    """
+    EXPANDABLE = ['orders', 'wishlist_items']
+
     balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    wishlist_items = WishlistSerializer(many=True, read_only=True)
-    orders = OrderSerializer(many=True, read_only=True)
-    groups = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+    groups = serializers.SerializerMethodField()
+    order_count = serializers.SerializerMethodField()
+    wishlist_count = serializers.SerializerMethodField()
 
     class Meta(BaseUserSerializer.Meta):
         ref_name = 'CustomUser'
-        fields = ['id', 'email', 'first_name', 'last_name', 'address', 'phone_number', 'balance','wishlist_items', 'orders', 'is_staff', 'groups']
+        fields = ['id', 'email', 'first_name', 'last_name', 'address', 'phone_number', 'balance', 'order_count', 'wishlist_count', 'is_staff', 'groups']
         read_only_fields = ['is_staff']
+
+    def get_groups(self, obj):
+        return sorted(get_roles(obj))
+
+    def get_order_count(self, obj):
+        return Order.objects.filter(user_id=obj.pk).count()
+
+    def get_wishlist_count(self, obj):
+        return Wishlist.objects.filter(user_id=obj.pk).count()
+
+    def get_expand(self):
+        request = self.context.get('request')
+        requested = request.query_params.get('expand', '').split(',') if request is not None else []
+        return [name for name in self.EXPANDABLE if name in requested]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        limit = getattr(settings, 'PROFILE_EXPAND_LIMIT', 10)
+        expand = self.get_expand()
+        if 'orders' in expand:
+            orders = (Order.objects.filter(user_id=instance.pk).order_by('-created_at', '-id')
+                      .prefetch_related('items__product__images', 'seller_orders')[:limit])
+            data['orders'] = OrderSerializer(orders, many=True, context=self.context).data
+        if 'wishlist_items' in expand:
+            wishlist = (Wishlist.objects.filter(user_id=instance.pk).order_by('-added_at', '-id')
+                        .prefetch_related(Prefetch('product', queryset=Product.objects.for_list()))[:limit])
+            data['wishlist_items'] = WishlistSerializer(wishlist, many=True, context=self.context).data
+        return data
+        
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        if getattr(settings, 'JWT_ROLES_CLAIM_ENABLED', True):
+            token[ROLES_CLAIM] = sorted(get_roles(user))
+            token['email'] = user.email
+            token['is_staff'] = user.is_staff
+        return token
         
 
 class DepositSerializer(serializers.ModelSerializer):
@@ -30,9 +84,10 @@ class DepositSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context['request'].user
-        deposit = Deposit.objects.create(user=user, amount=validated_data['amount'], status='completed')
-        user.balance += validated_data['amount']
-        user.save()
+        with transaction.atomic():
+            deposit = Deposit.objects.create(user=user, amount=validated_data['amount'], status='completed')
+            LedgerService.post(user.pk, validated_data['amount'], LedgerEntry.DEPOSIT, deposit=deposit)
+        user.refresh_from_db(fields=['balance'])
         return deposit
     
     def get_updated_balance(self, obj):
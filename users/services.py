@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from users.models import User, LedgerEntry, BalanceSnapshot
+from rest_framework.exceptions import ValidationError
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class LedgerService:
+    @staticmethod
+    def post(user_id, amount, kind, deposit=None, order=None, require_funds=False):
+        """
+        Record a balance change and apply it to `User.balance` with one conditional F() UPDATE in the same
+        transaction, so concurrent deposits and checkouts can't lose each other's writes. With
+        `require_funds`, a debit that would take the balance below zero raises instead.
+        """
+        with transaction.atomic():
+            users = User.objects.filter(pk=user_id)
+            if require_funds and amount < 0:
+                users = users.filter(balance__gte=-amount)
+            if not users.update(balance=F('balance') + amount):
+                raise ValidationError("Insufficient balance. Please deposit more funds.")
+            return LedgerEntry.objects.create(user_id=user_id, amount=amount, kind=kind, deposit=deposit, order=order)
+
+    @staticmethod
+    def latest_snapshot(user_id=OuterRef('pk'), before=None):
+        snapshots = BalanceSnapshot.objects.filter(user_id=user_id)
+        if before is not None:
+            snapshots = snapshots.filter(as_of__lte=before)
+        return snapshots.order_by('-as_of')
+
+    @staticmethod
+    def balance_at(user_id, when):
+        """Balance after every entry created up to `when`: the last snapshot before it plus the entries since"""
+        snapshot = LedgerService.latest_snapshot(user_id, before=when).first()
+        entries = LedgerEntry.objects.filter(user_id=user_id, created_at__lte=when)
+        if snapshot is not None:
+            entries = entries.filter(created_at__gt=snapshot.as_of)
+        total = entries.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        return (snapshot.balance if snapshot is not None else Decimal('0.00')) + total
+
+    @staticmethod
+    def with_ledger_balance(users, until=None):
+        """
+        Annotate `ledger_balance`: the last snapshot plus the entries after it (up to `until`). It is one
+        statement, so it reads `balance` and the ledger at the same instant.
+        """
+        snapshots = LedgerService.latest_snapshot(before=until)
+        entries = LedgerEntry.objects.filter(user_id=OuterRef('pk'), created_at__gt=OuterRef('snapshot_as_of'))
+        if until is not None:
+            entries = entries.filter(created_at__lte=until)
+        entries = entries.order_by().values('user_id').annotate(total=Sum('amount')).values('total')
+        return (users
+                .annotate(snapshot_balance=Coalesce(Subquery(snapshots.values('balance')[:1]), Value(Decimal('0.00')), output_field=MONEY),
+                          snapshot_as_of=Coalesce(Subquery(snapshots.values('as_of')[:1]), Value(EPOCH)))
+                .annotate(ledger_balance=F('snapshot_balance') + Coalesce(Subquery(entries), Value(Decimal('0.00')), output_field=MONEY)))
+
+    @staticmethod
+    def take_snapshots(batch_size=1000):
+        """
+        Snapshot every user whose ledger moved since their last snapshot, a batch of users at a time.
+        Snapshots trail now by LEDGER_SNAPSHOT_LAG so an entry committed late still falls after them.
+        """
+        as_of = timezone.now() - timedelta(seconds=getattr(settings, 'LEDGER_SNAPSHOT_LAG', 60))
+        taken, last_id = 0, 0
+        while True:
+            batch = list(User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return taken
+            last_id = batch[-1]
+            moved = set(LedgerEntry.objects.filter(user_id__in=batch, created_at__lte=as_of)
+                        .annotate(since=Coalesce(Subquery(LedgerService.latest_snapshot(OuterRef('user_id')).values('as_of')[:1]), Value(EPOCH)))
+                        .filter(created_at__gt=F('since')).order_by().values_list('user_id', flat=True).distinct())
+            if not moved:
+                continue
+            balances = LedgerService.with_ledger_balance(User.objects.filter(pk__in=moved), until=as_of)
+            BalanceSnapshot.objects.bulk_create([
+                BalanceSnapshot(user_id=user_id, balance=balance, as_of=as_of)
+                for user_id, balance in balances.values_list('pk', 'ledger_balance')
+            ], ignore_conflicts=True)
+            taken += len(moved)
+
+    @staticmethod
+    def reconcile(batch_size=1000):
+        """Yield (user_id, cached balance, ledger balance) for every user whose two balances disagree"""
+        last_id = 0
+        while True:
+            batch = list(LedgerService.with_ledger_balance(User.objects.filter(pk__gt=last_id).order_by('pk'))
+                         .values_list('pk', 'balance', 'ledger_balance')[:batch_size])
+            if not batch:
+                return
+            last_id = batch[-1][0]
+            for user_id, balance, ledger_balance in batch:
+                if balance != ledger_balance:
+                    yield user_id, balance, ledger_balance
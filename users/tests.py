@@ -1,3 +1,125 @@
-from django.test import TestCase
+from io import StringIO
+from decimal import Decimal
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework.exceptions import ValidationError
+from order.models import Order, Wishlist
+from product.models import Category
+from product.tests import make_seller, make_products
+from order.tests import ShopperTestCase
+from users.models import BalanceSnapshot, LedgerEntry
+from users.services import LedgerService
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(PROFILE_EXPAND_LIMIT=2)
+class ProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='x', first_name='Bu')
+        self.products = make_products(make_seller(), Category.objects.create(name='Fruit'), count=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill(self, count):
+        for index in range(count):
+            Order.objects.create(user=self.user, total_price=index + 1)
+        Wishlist.objects.bulk_create([Wishlist(user=self.user, product=product) for product in self.products],
+                                     ignore_conflicts=True)
+
+    def test_profile_has_counts_not_histories(self):
+        self.fill(3)
+        data = self.client.get('/api/v1/auth/users/me/').json()
+        self.assertEqual((data['order_count'], data['wishlist_count']), (3, 3))
+        self.assertNotIn('orders', data)
+        self.assertNotIn('wishlist_items', data)
+
+    def test_expand_is_bounded(self):
+        self.fill(3)
+        data = self.client.get('/api/v1/auth/users/me/', {'expand': 'orders,wishlist_items,unknown'}).json()
+        self.assertEqual([order['total_price'] for order in data['orders']], [3, 2])
+        self.assertEqual(len(data['wishlist_items']), 2)
+        self.assertNotIn('unknown', data)
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.fill(1)
+        # The first request also resolves the user's roles
+        self.client.get('/api/v1/auth/users/me/')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/v1/auth/users/me/', {'expand': 'orders,wishlist_items'})
+        self.fill(10)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/v1/auth/users/me/', {'expand': 'orders,wishlist_items'})
+        self.assertEqual(len(small), len(large))
+
+
+class LedgerTests(ShopperTestCase):
+    def entries(self):
+        return list(LedgerEntry.objects.filter(user=self.buyer).order_by('pk').values_list('kind', 'amount'))
+
+    def test_every_balance_change_is_an_entry(self):
+        response = self.client.post('/api/v1/deposits/', {'amount': '25.00'}, headers={'Idempotency-Key': 'd1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(str(response.json()['updated_balance'])), 125)
+        self.client.post('/api/v1/deposits/', {'amount': '25.00'}, headers={'Idempotency-Key': 'd1'})
+        self.add(self.product, 2)
+        order_id = self.checkout().json()['id']
+        self.assertEqual(self.entries(), [(LedgerEntry.DEPOSIT, 100), (LedgerEntry.DEPOSIT, 25), (LedgerEntry.ORDER, -4)])
+        self.assertEqual(str(LedgerEntry.objects.get(kind=LedgerEntry.ORDER).order_id), order_id)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.balance, 121)
+
+    def test_entries_are_immutable(self):
+        entry = LedgerEntry.objects.get(user=self.buyer)
+        entry.amount = 1000
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_debits_can_not_overdraw(self):
+        with self.assertRaises(ValidationError):
+            LedgerService.post(self.buyer.pk, -101, LedgerEntry.ADJUSTMENT, require_funds=True)
+        self.assertEqual(len(self.entries()), 1)
+
+    @override_settings(LEDGER_SNAPSHOT_LAG=60)
+    def test_snapshots_and_balance_at(self):
+        start = timezone.now() - timedelta(hours=3)
+        LedgerService.post(self.buyer.pk, 50, LedgerEntry.DEPOSIT)
+        LedgerService.post(self.buyer.pk, -30, LedgerEntry.ADJUSTMENT)
+        for offset, entry in enumerate(LedgerEntry.objects.filter(user=self.buyer).order_by('pk')):
+            LedgerEntry.objects.filter(pk=entry.pk).update(created_at=start + timedelta(hours=offset))
+
+        out = StringIO()
+        call_command('snapshot_balances', stdout=out)
+        self.assertIn('Took 1', out.getvalue())
+        self.assertEqual(BalanceSnapshot.objects.get(user=self.buyer).balance, 120)
+        self.assertEqual(LedgerService.take_snapshots(), 0)
+
+        for offset, expected in [(-1, 0), (0, 100), (1, 150), (2, 120)]:
+            with self.subTest(offset=offset):
+                self.assertEqual(LedgerService.balance_at(self.buyer.pk, start + timedelta(hours=offset, minutes=1)), expected)
+        # Entries after the snapshot are added on top of it
+        LedgerService.post(self.buyer.pk, 5, LedgerEntry.DEPOSIT)
+        self.assertEqual(LedgerService.balance_at(self.buyer.pk, timezone.now()), 125)
+
+    def test_reconcile_reports_drift(self):
+        call_command('reconcile_balances', stdout=StringIO())
+        User.objects.filter(pk=self.buyer.pk).update(balance=1)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_balances', stdout=out)
+        self.assertIn(f'user {self.buyer.pk}: balance 1.00, ledger 100', out.getvalue())
+
+    def test_balance_endpoint(self):
+        LedgerEntry.objects.filter(user=self.buyer).update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(Decimal(str(self.client.get('/api/v1/deposits/balance/').json()['balance'])), 100)
+        before = (timezone.now() - timedelta(days=2)).isoformat()
+        self.assertEqual(Decimal(str(self.client.get('/api/v1/deposits/balance/', {'at': before}).json()['balance'])), 0)
+        self.assertEqual(self.client.get('/api/v1/deposits/balance/', {'at': 'yesterday'}).status_code, 400)
@@ -1,13 +1,20 @@
-from .models import Deposit
+from .models import Deposit, LedgerEntry
+from users.services import LedgerService
+from api.roles import is_seller
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from api.idempotency import idempotent
 from drf_yasg import openapi
 from rest_framework import status
 from product.models import Product
 from sslcommerz_lib import SSLCOMMERZ
 from rest_framework.views import APIView
-from order.models import OrderItem, Order
+from order.models import OrderItem, Order, SellerOrder
 from rest_framework.response import Response
-from django.contrib.auth.models import Group
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import generics, permissions
@@ -15,6 +22,7 @@ from django.shortcuts import HttpResponseRedirect
 from django.conf import settings as main_settings
 from rest_framework.permissions import IsAuthenticated
 from users.serializers import UserSerializer, DepositSerializer
+from product.paginations import KeysetPagination
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -38,7 +46,6 @@ class DashboardView(APIView):
     )
     def get(self, request):
         user = request.user
-        seller_group = Group.objects.get(name='seller')
 
         total_users = User.objects.count()
         total_sellers = User.objects.filter(groups__name='seller').count()
@@ -57,14 +64,13 @@ class DashboardView(APIView):
                 'products': list(products),
             })
 
-        elif seller_group in user.groups.all():
+        elif is_seller(user):
             seller_products = Product.objects.filter(seller=user)
-            product_ids = seller_products.values_list('id', flat=True)
-            sales = OrderItem.objects.filter(product_id__in=product_ids)
+            sales = SellerOrder.objects.filter(seller_id=user.pk).aggregate(count=Sum('item_count'), revenue=Sum('total_price'))
 
             total_products = seller_products.count()
-            total_sales = sales.count()
-            total_revenue = sum([item.total_price for item in sales])
+            total_sales = sales['count'] or 0
+            total_revenue = sales['revenue'] or 0
 
             return Response({
                 'role': 'seller',
@@ -83,6 +89,7 @@ class DashboardView(APIView):
 class DepositViewSet(ModelViewSet):
     serializer_class = DepositSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -114,11 +121,38 @@ class DepositViewSet(ModelViewSet):
         operation_summary="Create Deposit",
         operation_description="Create a new deposit for the logged-in user.",
         request_body=DepositSerializer,
+        manual_parameters=[openapi.Parameter('Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+                                             description="Retries with the same key return the first response")],
         responses={201: DepositSerializer}
     )
+    @idempotent('deposits.create')
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Balance at a point in time",
+        operation_description=(
+            "The logged-in user's balance after every ledger entry up to `at` (ISO 8601, default now), "
+            "computed from the nearest balance snapshot instead of the whole history."
+        ),
+        manual_parameters=[openapi.Parameter('at', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME)],
+        responses={200: 'Balance'}
+    )
+    @action(detail=False, methods=['get'])
+    def balance(self, request):
+        at = timezone.now()
+        if request.query_params.get('at'):
+            try:
+                at = parse_datetime(request.query_params['at'])
+            except ValueError:
+                at = None
+            if at is None:
+                raise ValidationError({'at': "Must be an ISO 8601 datetime"})
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+        return Response({'at': at, 'balance': LedgerService.balance_at(request.user.pk, at)})
+
     @swagger_auto_schema(
         operation_summary="Update Deposit",
         operation_description="Update details of an existing deposit.",
@@ -182,35 +216,44 @@ def initiate_payment(request):
 
 
 
+def get_tran_id(request):
+    return request.data.get("tran_id") or request.GET.get("tran_id")
+
+
 @api_view(['POST'])
+@idempotent('payment.success', key_func=get_tran_id)
 def payment_success(request):
+    # Only bad input is answered (and stored for replay) as a client error; anything else propagates,
+    # which drops the idempotency key so the gateway's retry runs again
+    try:
+        deposit_id = int(get_tran_id(request).split('_')[1])
+    except (AttributeError, IndexError, ValueError):
+        return Response({"error": "Malformed tran_id"}, status=400)
     try:
-        tran_id = request.data.get("tran_id") or request.GET.get("tran_id")
-        deposit_id = tran_id.split('_')[1]
         deposit = Deposit.objects.get(id=deposit_id)
-        deposit.status = "completed"
-        deposit.user.balance += deposit.amount
-        deposit.user.save()
-        deposit.save()
+    except Deposit.DoesNotExist:
+        return Response({"error": "Deposit not found"}, status=404)
+    # Only the pending -> completed transition credits the balance, so gateway re-posts can't credit twice
+    with transaction.atomic():
+        if Deposit.objects.filter(pk=deposit.pk, status='pending').update(status='completed', updated_at=timezone.now()):
+            LedgerService.post(deposit.user_id, deposit.amount, LedgerEntry.DEPOSIT, deposit=deposit)
+
+    return HttpResponseRedirect(f"{main_settings.FRONTEND_URL}/dashboard/payment/success/")
 
-        return HttpResponseRedirect(f"{main_settings.FRONTEND_URL}/dashboard/payment/success/")
-    except Exception as e:
-        return Response({"error": str(e)}, status=400)
+
+def fail_deposit(request):
+    deposit_id = get_tran_id(request).split('_')[1]
+    Deposit.objects.filter(id=deposit_id, status='pending').update(status='failed', updated_at=timezone.now())
+    return HttpResponseRedirect(f"{main_settings.FRONTEND_URL}/dashboard/deposit")
 
 
 @api_view(['POST'])
+@idempotent('payment.cancel', key_func=get_tran_id)
 def payment_cancel(request):
-    deposit_id = request.data.get("tran_id").split('_')[1]
-    deposit = Deposit.objects.get(id=deposit_id)
-    deposit.status = "failed"
-    deposit.save()
-    return HttpResponseRedirect(f"{main_settings.FRONTEND_URL}/dashboard/deposit")
+    return fail_deposit(request)
 
 
 @api_view(['POST'])
+@idempotent('payment.fail', key_func=get_tran_id)
 def payment_fail(request):
-    deposit_id = request.data.get("tran_id").split('_')[1]
-    deposit = Deposit.objects.get(id=deposit_id)
-    deposit.status = "failed"
-    deposit.save()
-    return HttpResponseRedirect(f"{main_settings.FRONTEND_URL}/dashboard/deposit")
\ No newline at end of file
+    return fail_deposit(request)
\ No newline at end of file